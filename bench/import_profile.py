@@ -0,0 +1,127 @@
+"""
+Import-time report for the service, from ``python -X importtime``.
+
+Imports the app module in a fresh interpreter (as each gunicorn worker does
+without --preload) and lists the slowest top-level packages and modules, and
+the RSS of the process once the import is done.
+
+    python bench/import_profile.py
+    python bench/import_profile.py --module src.agents --top 15 --json
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time: self [us] | cumulative | imported package"
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# settings fail without these; nothing is called, so placeholders will do
+PLACEHOLDER_ENV = {
+    "ASSEMBLYAI_API_KEY": "import-profile",
+    "ASSEMBLYAI_BASE_URL": "http://127.0.0.1:9",
+    "OPENAI_ORG_KEY": "import-profile",
+    "OPENAI_API_KEY": "import-profile",
+}
+
+PROBE = """
+import resource, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print("RESULT", elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+      len(sys.modules), file=sys.stderr)
+"""
+
+
+def profile(module: str) -> dict:
+    env = {**PLACEHOLDER_ENV, **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    modules: List[dict] = []
+    packages: Dict[str, int] = defaultdict(int)
+    summary = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append(
+                {
+                    "module": name,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                    "depth": len(indent) // 2,
+                }
+            )
+            packages[name.split(".")[0]] += int(self_us)
+        elif line.startswith("RESULT "):
+            _, elapsed, max_rss_kb, module_count = line.split()
+            summary = {
+                "import_seconds": round(float(elapsed), 3),
+                "max_rss_mb": round(int(max_rss_kb) / 1024, 1),
+                "modules": int(module_count),
+            }
+
+    return {
+        "module": module,
+        **summary,
+        "packages": sorted(
+            ({"package": name, "self_ms": us / 1000} for name, us in packages.items()),
+            key=lambda package: package["self_ms"],
+            reverse=True,
+        ),
+        "slowest_modules": sorted(
+            modules, key=lambda module: module["self_ms"], reverse=True
+        ),
+    }
+
+
+def print_report(report: dict, top: int):
+    print(
+        f"import {report['module']}: {report['import_seconds']}s, "
+        f"{report['modules']} modules, max RSS {report['max_rss_mb']} MB\n"
+    )
+    print(f"{'package':<32} {'self ms':>10}")
+    for package in report["packages"][:top]:
+        print(f"{package['package']:<32} {package['self_ms']:>10.1f}")
+    print(f"\n{'module':<48} {'self ms':>10} {'cumul. ms':>10}")
+    for module in report["slowest_modules"][:top]:
+        print(
+            f"{module['module']:<48} {module['self_ms']:>10.1f} "
+            f"{module['cumulative_ms']:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--module", default="server.main")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--json", action="store_true", help="print JSON instead")
+    args = parser.parse_args()
+
+    report = profile(args.module)
+    if args.json:
+        report["packages"] = report["packages"][: args.top]
+        report["slowest_modules"] = report["slowest_modules"][: args.top]
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Local stand-ins for the AssemblyAI and OpenAI APIs, used by the benchmark.
+
+Serves, on one port:
+    POST /upload, POST /transcript, GET /transcript/{id}   (AssemblyAI)
+    POST /v1/chat/completions                              (OpenAI, incl. stream)
+
+Latency, error rate and 429 behaviour are configurable so the service can be
+measured without calling (and paying for) the real providers.
+
+    python bench/mock_servers.py --port 8900 --transcript-seconds 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from aiohttp import web
+
+WORDS = (
+    "we agreed to ship the new onboarding flow next sprint and review the budget "
+    "for marketing after the customer interviews are summarised by the team"
+).split()
+
+
+@dataclass
+class MockConfig:
+    upload_latency: float = 0.05  # seconds, plus time to read the body
+    request_latency: float = 0.02  # submit and poll calls
+    transcript_seconds: float = 3  # until a submitted transcript is completed
+    transcript_words: int = 400
+    chat_latency: float = 1.0  # seconds for a whole completion
+    chat_words: int = 200
+    error_rate: float = 0.0  # fraction of calls answered with a 500
+    throttle_rate: float = 0.0  # fraction of calls answered with a 429
+    rpm: int = 0  # per-API requests per minute before 429s, 0 disables
+    retry_after: float = 1.0
+
+
+@dataclass
+class MockState:
+    config: MockConfig
+    transcripts: Dict[str, float] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+    windows: Dict[str, Deque[float]] = field(default_factory=dict)
+
+    def count(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def failure(self, api: str) -> Optional[web.Response]:
+        """
+        Return an error response if this call should fail, None otherwise.
+        """
+        config = self.config
+        headers = {"Retry-After": str(config.retry_after)}
+        if config.rpm:
+            window = self.windows.setdefault(api, deque())
+            now = time.monotonic()
+            while window and window[0] < now - 60:
+                window.popleft()
+            if len(window) >= config.rpm:
+                self.count(f"{api}:429")
+                return web.json_response(
+                    {"error": "rate limited"}, status=429, headers=headers
+                )
+            window.append(now)
+
+        roll = random.random()
+        if roll < config.throttle_rate:
+            self.count(f"{api}:429")
+            return web.json_response(
+                {"error": "rate limited"}, status=429, headers=headers
+            )
+        if roll < config.throttle_rate + config.error_rate:
+            self.count(f"{api}:500")
+            return web.json_response({"error": "internal error"}, status=500)
+        return None
+
+
+def _transcript(transcript_id: str, words: int) -> dict:
+    text_words = [WORDS[i % len(WORDS)] for i in range(words)]
+    return {
+        "id": transcript_id,
+        "status": "completed",
+        "text": " ".join(text_words),
+        "words": [
+            {"text": word, "start": i * 400, "end": i * 400 + 350, "confidence": 0.9}
+            for i, word in enumerate(text_words)
+        ],
+        "audio_duration": words * 0.4,
+    }
+
+
+async def upload(request: web.Request) -> web.Response:
+    state: MockState = request.app["state"]
+    async for _ in request.content.iter_chunked(64 * 1024):
+        pass
+    state.count("upload")
+    if failure := state.failure("assemblyai"):
+        return failure
+    await asyncio.sleep(state.config.upload_latency)
+    return web.json_response(
+        {"upload_url": f"https://cdn.example.com/{uuid.uuid4().hex}"}
+    )
+
+
+async def submit(request: web.Request) -> web.Response:
+    state: MockState = request.app["state"]
+    await request.json()
+    state.count("submit")
+    if failure := state.failure("assemblyai"):
+        return failure
+    await asyncio.sleep(state.config.request_latency)
+    transcript_id = uuid.uuid4().hex
+    state.transcripts[transcript_id] = (
+        time.monotonic() + state.config.transcript_seconds
+    )
+    return web.json_response({"id": transcript_id, "status": "queued"})
+
+
+async def get_transcript(request: web.Request) -> web.Response:
+    state: MockState = request.app["state"]
+    transcript_id = request.match_info["transcript_id"]
+    state.count("poll")
+    if failure := state.failure("assemblyai"):
+        return failure
+    await asyncio.sleep(state.config.request_latency)
+
+    ready_at = state.transcripts.get(transcript_id)
+    if ready_at is None:
+        return web.json_response({"error": "not found"}, status=404)
+    if time.monotonic() < ready_at:
+        return web.json_response({"id": transcript_id, "status": "processing"})
+    return web.json_response(_transcript(transcript_id, state.config.transcript_words))
+
+
+def _completion_text(body: dict, words: int) -> str:
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(words))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        keys = response_format["json_schema"]["schema"]["properties"]
+        return json.dumps({key: text for key in keys})
+    return text
+
+
+async def chat(request: web.Request) -> web.StreamResponse:
+    state: MockState = request.app["state"]
+    body = await request.json()
+    state.count("chat")
+    if failure := state.failure("openai"):
+        return failure
+
+    config = state.config
+    content = _completion_text(body, config.chat_words)
+    usage = {"prompt_tokens": 1000, "completion_tokens": 300, "total_tokens": 1300}
+
+    if not body.get("stream"):
+        await asyncio.sleep(config.chat_latency)
+        return web.json_response(
+            {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    pieces = content.split(" ")
+    for piece in pieces:
+        await asyncio.sleep(config.chat_latency / len(pieces))
+        chunk = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {"index": 0, "delta": {"content": piece + " "}, "finish_reason": None}
+            ],
+        }
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+    final = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [],
+        "usage": usage,
+    }
+    await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+    return response
+
+
+async def stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["state"].calls)
+
+
+def build_app(config: MockConfig) -> web.Application:
+    app = web.Application(client_max_size=0)
+    app["state"] = MockState(config=config)
+    app.router.add_post("/upload", upload)
+    app.router.add_post("/transcript", submit)
+    app.router.add_get("/transcript/{transcript_id}", get_transcript)
+    app.router.add_post("/v1/chat/completions", chat)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    for name, value in vars(MockConfig()).items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}", type=type(value), default=value
+        )
+    args = parser.parse_args()
+
+    config = MockConfig(**{name: getattr(args, name) for name in vars(MockConfig())})
+    web.run_app(build_app(config), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""
+End-to-end benchmark of the service against the local mock providers.
+
+Starts bench/mock_servers.py and the app under gunicorn (uvicorn workers) with
+a throwaway env file, drives one scenario at each concurrency level and
+reports latency percentiles, throughput, peak RSS and open sockets per worker.
+
+    python bench/run.py submit --concurrency 1 4 16 --jobs 32
+    python bench/run.py download --concurrency 8 32 --requests 1000
+    python bench/run.py submit --mock transcript_seconds=10 --mock throttle_rate=0.1 \\
+        --set JOB_WORKERS_PER_PROCESS=32 --json baseline.json
+
+Peak RSS and socket counts are read from /proc, so they are Linux only.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINAL_STATES = ("completed", "failed")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(pct) - 1]
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+@dataclass
+class ProcessSampler:
+    """
+    Samples RSS and open sockets of the gunicorn workers (children of the
+    master process) in a background thread, keeping the peak per worker.
+    """
+
+    master_pid: int
+    interval: float = 0.25
+    peak_rss: Dict[int, int] = field(default_factory=dict)
+    peak_sockets: Dict[int, int] = field(default_factory=dict)
+    _stop: threading.Event = field(default_factory=threading.Event)
+    _thread: Optional[threading.Thread] = None
+
+    def _workers(self) -> List[int]:
+        try:
+            with open(f"/proc/{self.master_pid}/task/{self.master_pid}/children") as f:
+                return [int(pid) for pid in f.read().split()]
+        except OSError:
+            return []
+
+    @staticmethod
+    def _rss(pid: int) -> int:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    @staticmethod
+    def _sockets(pid: int) -> int:
+        count = 0
+        for fd in os.listdir(f"/proc/{pid}/fd"):
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:"):
+                    count += 1
+            except OSError:
+                pass
+        return count
+
+    def sample(self):
+        for pid in self._workers():
+            try:
+                rss, sockets = self._rss(pid), self._sockets(pid)
+            except OSError:
+                continue
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss)
+            self.peak_sockets[pid] = max(self.peak_sockets.get(pid, 0), sockets)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def reset(self):
+        self.peak_rss.clear()
+        self.peak_sockets.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self) -> dict:
+        return {
+            "peak_rss_mb": {
+                str(pid): round(rss / 1024 / 1024, 1)
+                for pid, rss in self.peak_rss.items()
+            },
+            "peak_sockets": {str(pid): n for pid, n in self.peak_sockets.items()},
+        }
+
+
+def _wait_until_up(port: int, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args} exited with {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port)):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+@contextmanager
+def running_service(args) -> Iterator[tuple]:
+    """
+    Start the mock providers and the app; yields (base url, sampler).
+    """
+    mock_port, app_port = _free_port(), _free_port()
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        mock_cmd = [sys.executable, os.path.join(ROOT, "bench", "mock_servers.py")]
+        mock_cmd += ["--port", str(mock_port)]
+        for item in args.mock:
+            name, _, value = item.partition("=")
+            mock_cmd += [f"--{name.replace('_', '-')}", value]
+
+        env = {
+            "ASSEMBLYAI_API_KEY": "bench",
+            "ASSEMBLYAI_BASE_URL": f"http://127.0.0.1:{mock_port}",
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_ORG_KEY": "bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+            "DATA_DIR": os.path.join(tmp, "data"),
+            "METRICS_DIR": os.path.join(tmp, "data", "metrics"),
+            "UPLOAD_DIR": os.path.join(tmp, "uploads"),
+            # measure the pipeline, not the caches
+            "TRANSCRIPT_CACHE_ENABLED": "false",
+            "RESPONSE_CACHE_ENABLED": "false",
+            # random bytes are not audio
+            "AUDIO_PREPROCESS_ENABLED": "false",
+            "RETENTION_SWEEP_INTERVAL": "0",
+            "PATTERN_RELOAD_INTERVAL": "0",
+            "TRANSCRIPT_POLL_MIN_INTERVAL": "0.5",
+            "JOB_POLL_INTERVAL": "0.5",
+        }
+        for item in args.set:
+            name, _, value = item.partition("=")
+            env[name] = value
+        env_file = os.path.join(tmp, "bench.env")
+        with open(env_file, "w") as f:
+            f.writelines(f"{name}={value}\n" for name, value in env.items())
+
+        app_cmd = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "server.main:app",
+            "--preload",
+            "--workers",
+            str(args.workers),
+            "--worker-class",
+            "uvicorn.workers.UvicornWorker",
+            "--bind",
+            f"127.0.0.1:{app_port}",
+            "--log-level",
+            "warning",
+        ]
+        log = open(os.path.join(tmp, "service.log"), "w")
+        mock = subprocess.Popen(mock_cmd, cwd=ROOT, stdout=log, stderr=log)
+        app = subprocess.Popen(
+            app_cmd,
+            cwd=ROOT,
+            env={**os.environ, "ENV_FILE": env_file},
+            stdout=log,
+            stderr=log,
+        )
+        sampler = ProcessSampler(master_pid=app.pid)
+        try:
+            base_url = f"http://127.0.0.1:{app_port}"
+            _wait_until_up(mock_port, mock)
+            _wait_until_up(app_port, app)
+            sampler.start()
+            yield base_url, sampler
+        finally:
+            sampler.stop()
+            app.terminate()
+            mock.terminate()
+            app.wait(timeout=30)
+            mock.wait(timeout=30)
+            log.close()
+            if args.keep_logs:
+                with open(os.path.join(tmp, "service.log")) as f:
+                    sys.stderr.write(f.read())
+
+
+async def _submit(session: aiohttp.ClientSession, base_url: str, args) -> dict:
+    form = aiohttp.FormData()
+    form.add_field("knowledge_patterns", args.patterns)
+    form.add_field("audio_file", os.urandom(args.audio_bytes), filename="bench.wav")
+    params = {
+        "language": "en",
+        "meeting_subject": "Benchmark meeting",
+        "department": args.department,
+    }
+    async with session.post(
+        f"{base_url}/meeting/submit-meeting", params=params, data=form
+    ) as response:
+        response.raise_for_status()
+        return await response.json()
+
+
+async def _wait_for_job(
+    session: aiohttp.ClientSession, base_url: str, job_id: str
+) -> str:
+    while True:
+        async with session.get(f"{base_url}/meeting/jobs/{job_id}") as response:
+            job = await response.json()
+        if job["state"] in FINAL_STATES:
+            return job["state"]
+        await asyncio.sleep(0.2)
+
+
+async def scenario_submit(base_url: str, concurrency: int, args) -> dict:
+    """
+    Submit ``--jobs`` meetings, ``concurrency`` at a time, and wait for each
+    to finish. Reports submit latency, end-to-end job latency and jobs/s.
+    """
+    submit_latency, job_latency, states = [], [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(session: aiohttp.ClientSession):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                submitted = await _submit(session, base_url, args)
+            except aiohttp.ClientError:
+                states.append("rejected")
+                return
+            submit_latency.append(time.monotonic() - started)
+            states.append(await _wait_for_job(session, base_url, submitted["job_id"]))
+            job_latency.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    connector = aiohttp.TCPConnector(limit=concurrency * 2)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[one(session) for _ in range(args.jobs)])
+    elapsed = time.monotonic() - started
+
+    return {
+        "submit_latency": summarize(submit_latency),
+        "job_latency": summarize(job_latency),
+        "jobs_per_second": states.count("completed") / elapsed,
+        "states": {state: states.count(state) for state in set(states)},
+        "elapsed": elapsed,
+    }
+
+
+async def scenario_download(base_url: str, concurrency: int, args) -> dict:
+    """
+    Finish one meeting, then fetch its wisdom file ``--requests`` times with
+    ``concurrency`` clients. Reports request latency and requests/s.
+    """
+    latency, statuses = [], []
+    async with aiohttp.ClientSession() as session:
+        submitted = await _submit(session, base_url, args)
+        await _wait_for_job(session, base_url, submitted["job_id"])
+        url = f"{base_url}/meeting/wisdom-file/{submitted['dir_search_path']}"
+        queue: asyncio.Queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+
+        async def client():
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.monotonic()
+                async with session.get(url) as response:
+                    await response.read()
+                    statuses.append(response.status)
+                latency.append(time.monotonic() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*[client() for _ in range(concurrency)])
+        elapsed = time.monotonic() - started
+
+    return {
+        "latency": summarize(latency),
+        "requests_per_second": len(latency) / elapsed,
+        "statuses": {str(s): statuses.count(s) for s in set(statuses)},
+        "elapsed": elapsed,
+    }
+
+
+SCENARIOS = {"submit": scenario_submit, "download": scenario_download}
+
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_report(results: List[dict]):
+    for result in results:
+        print(f"\n== {result['scenario']} @ concurrency {result['concurrency']}")
+        for name, value in result.items():
+            if name in ("scenario", "concurrency"):
+                continue
+            if isinstance(value, dict):
+                value = ", ".join(f"{k}={_format(v)}" for k, v in value.items())
+            print(f"  {name:<20} {_format(value)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("scenario", choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--jobs", type=int, default=16, help="submit: meetings")
+    parser.add_argument(
+        "--requests", type=int, default=500, help="download: requests per level"
+    )
+    parser.add_argument("--audio-bytes", type=int, default=512 * 1024)
+    parser.add_argument("--patterns", default="summary,keynote")
+    parser.add_argument("--department", default="trademan")
+    parser.add_argument(
+        "--mock", action="append", default=[], help="mock option, e.g. chat_latency=2"
+    )
+    parser.add_argument(
+        "--set", action="append", default=[], help="app setting, e.g. OPENAI_RPM=0"
+    )
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--keep-logs", action="store_true", help="print service logs")
+    args = parser.parse_args()
+
+    results = []
+    with running_service(args) as (base_url, sampler):
+        for concurrency in args.concurrency:
+            sampler.reset()
+            result = asyncio.run(SCENARIOS[args.scenario](base_url, concurrency, args))
+            sampler.sample()
+            results.append(
+                {
+                    "scenario": args.scenario,
+                    "concurrency": concurrency,
+                    **result,
+                    **sampler.report(),
+                }
+            )
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"args": vars(args), "results": results}, f, indent=2, default=str
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import gc
+import os
+import shutil
+
+from server import settings
+
+# every worker writes its prometheus samples here; /metrics merges them
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.METRICS_DIR
+
+
+def on_starting(server):
+    # samples of a previous run must not be merged into this one
+    shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+
+
+def when_ready(server):
+    # with --preload the app was imported here; finish loading the read-only
+    # state and move it out of the GC's reach so collections in the workers
+    # don't write to (and un-share) those pages
+    if server.cfg.preload_app:
+        from server.main import preload
+
+        preload()
+        gc.freeze()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,4 +1,3 @@
-
 from typing import Any, Callable
 
 from fastapi import APIRouter as FastAPIRouter
@@ -1,9 +1,50 @@
-from fastapi import FastAPI
+import uuid
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from server.settings import TRACE_ID
+from src.audio import audio_preprocessor
+from src.clients import http_clients
+from src.jobs import job_queue
+from src.metrics import render_metrics
+from src.patterns import pattern_registry
+from src.retention import retention_sweeper
 from src.routes import meeting_router
+from src.transcript_waiter import transcript_waiter
+from src.views import MeetingProcessor
+
+
+def preload():
+    """
+    Called once in the gunicorn master when the app is preloaded, before the
+    workers fork, so they share the loaded modules and pattern prompts
+    copy-on-write. Must not open sockets, event loops, threads or pools: the
+    shared clients, job queue and ffmpeg pool are created per worker in
+    ``lifespan``.
+    """
+    import openai  # noqa: F401  (workers import it lazily otherwise)
+
+    pattern_registry.load()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pattern_registry.start()
+    await http_clients.start()
+    job_queue.start(MeetingProcessor.run_job)
+    retention_sweeper.start()
+    yield
+    await retention_sweeper.stop()
+    await job_queue.stop()
+    await pattern_registry.stop()
+    await transcript_waiter.stop()
+    await http_clients.close()
+    audio_preprocessor.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["*"]
 
@@ -16,4 +57,23 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # reuse the caller's id so logs can be followed across services
+    trace_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    token = TRACE_ID.set(trace_id)
+    try:
+        response = await call_next(request)
+    finally:
+        TRACE_ID.reset(token)
+    response.headers["X-Request-ID"] = trace_id
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 app.include_router(meeting_router)
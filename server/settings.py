@@ -1,16 +1,34 @@
 import logging
+import os
 import pathlib
+from contextvars import ContextVar
 from datetime import UTC, timezone
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import ValidationError
 from pydantic_settings import BaseSettings
 
-load_dotenv(verbose=True, override=True)
-
 ROOT = pathlib.Path(__file__).resolve().parent.parent
-log_format = "%(levelname) -10s %(funcName) " "-25s %(lineno) -1d: %(message)s"
+# ENV_FILE lets a deployment (or the bench/ harness) point at another env file
+ENV_FILE = os.environ.get("ENV_FILE", f"{ROOT}/.env")
+
+load_dotenv(ENV_FILE, verbose=True, override=True)
+# id of the request (or of the job it queued) that a log line belongs to
+TRACE_ID: ContextVar[str] = ContextVar("trace_id", default="-")
+_record_factory = logging.getLogRecordFactory()
+
+
+def _record_with_trace_id(*args, **kwargs) -> logging.LogRecord:
+    record = _record_factory(*args, **kwargs)
+    record.trace_id = TRACE_ID.get()
+    return record
+
+
+logging.setLogRecordFactory(_record_with_trace_id)
+log_format = (
+    "%(levelname) -10s %(trace_id)s %(funcName) " "-25s %(lineno) -1d: %(message)s"
+)
 logging.basicConfig(level=logging.INFO, format=log_format)
 
 
@@ -19,15 +37,138 @@ class Settings(BaseSettings):
     ASSEMBLYAI_BASE_URL: str
     OPENAI_ORG_KEY: str
     OPENAI_API_KEY: str
+    OPENAI_BASE_URL: Optional[str] = None  # e.g. a proxy or the bench/ mock server
 
     # OPTIONAL SETTINGS
-    FILE_DELETE_TIME: int = 60
+    FILE_DELETE_TIME: int = 3600  # seconds raw audio is kept after a meeting's last use
+    PRECOMPRESS_RESULTS: bool = True  # write .gz/.zst next to result files
     LOGGER: Optional[logging.Logger] = logging.getLogger(__name__)
     UPLOAD_DIR: str = f"{ROOT}/uploads"
+    PATTERNS_DIR: str = f"{ROOT}/patterns"
+    PATTERN_RELOAD_INTERVAL: float = 5  # seconds between mtime checks, 0 disables
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1 MB chunks for disk and network I/O
+    # stream the incoming file to AssemblyAI while it is being written to disk
+    ASSEMBLYAI_TEE_UPLOAD: bool = False
+    TEE_UPLOAD_QUEUE_CHUNKS: int = 8  # bounds memory held per tee'd upload
+    # a job waits this long for its tee'd upload before a worker uploads from disk
+    TEE_UPLOAD_HOLD_SECONDS: float = 900
+    DATA_DIR: str = f"{ROOT}/data"  # local state: caches, markers, databases
+    # per-process prometheus files, shared by all gunicorn workers
+    METRICS_DIR: str = f"{ROOT}/data/metrics"
+
+    # RETENTION (one sweeper at a time across workers)
+    RETENTION_SWEEP_INTERVAL: float = 300  # 0 disables the sweeper
+    RESULT_RETENTION_SECONDS: int = (
+        30 * 24 * 3600
+    )  # whole meeting dirs, 0 keeps forever
+    UPLOAD_DIR_MAX_BYTES: int = 20 * 1024 * 1024 * 1024  # 20 GB, 0 disables the quota
+
+    # RESUMABLE UPLOADS (POST /meeting/uploads)
+    UPLOAD_SESSION_MAX_BYTES: int = 8 * 1024 * 1024 * 1024  # 8 GB per recording
+    UPLOAD_SESSION_CHUNK_SIZE: int = 8 * 1024 * 1024  # suggested to clients
+    UPLOAD_SESSION_MAX_CHUNK_BYTES: int = 64 * 1024 * 1024  # largest single PUT
+    UPLOAD_SESSION_TTL: int = 24 * 3600  # seconds an idle session is kept
+    UPLOAD_SESSION_MAX_OPEN: int = 16  # across all workers, 0 = no limit
+
+    # AUDIO PREPROCESSING (ffmpeg, before upload; skipped if ffmpeg is missing)
+    AUDIO_PREPROCESS_ENABLED: bool = True
+    AUDIO_PREPROCESS_WORKERS: int = 2  # processes per worker
+    AUDIO_PREPROCESS_SAMPLE_RATE: int = 16000
+    AUDIO_PREPROCESS_BITRATE: str = "24k"  # opus, mono
+    # leading silence is added back to the transcript's timestamps
+    AUDIO_PREPROCESS_TRIM_SILENCE: bool = True
+    AUDIO_SILENCE_THRESHOLD_DB: int = -50
+    AUDIO_PREPROCESS_TIMEOUT: float = 1800
+
+    # TRANSCRIPT COMPLETION
+    # public base url of this service; when set AssemblyAI calls our webhook
+    ASSEMBLYAI_WEBHOOK_BASE_URL: Optional[str] = None
+    # required for the webhook: without it no webhook_url is sent and the route 404s
+    ASSEMBLYAI_WEBHOOK_SECRET: Optional[str] = None
+    WEBHOOK_MARKER_TTL: int = 24 * 3600  # unconsumed markers are removed after this
+    TRANSCRIPT_WEBHOOK_CHECK_INTERVAL: float = 1.0
+    AUDIO_BYTES_PER_SECOND_ESTIMATE: int = 16000  # ~128 kbps, for duration hints
+    TRANSCRIPT_POLL_INITIAL_RATIO: float = 0.15  # first poll after 15% of duration
+    TRANSCRIPT_POLL_MIN_INTERVAL: float = 3
+    TRANSCRIPT_POLL_MAX_INTERVAL: float = 60
+    TRANSCRIPT_POLL_BACKOFF: float = 1.5
+    TRANSCRIPT_POLL_CONCURRENCY: int = 10
+    TRANSCRIPT_TIMEOUT_MIN: float = 600
+    TRANSCRIPT_TIMEOUT_FACTOR: float = 3  # timeout as a multiple of audio duration
+
+    # LONG TRANSCRIPTS (map-reduce over token-budgeted chunks)
+    LONG_TRANSCRIPT_TOKENS: int = 60000  # above this the transcript is chunked
+    CHUNK_TOKENS: int = 12000
+    CHUNK_OVERLAP_TOKENS: int = 500
+    CHUNK_PARALLELISM: int = 4  # concurrent chunk calls per meeting
+
+    # COMBINED PATTERNS (one request for all patterns: "auto", "on" or "off")
+    # auto never combines while results stream (STREAM_PATTERN_TOKENS or an SSE client)
+    COMBINED_PATTERNS_MODE: Literal["auto", "on", "off"] = "auto"
+    COMBINED_PATTERNS_MIN_TOKENS: int = 2000  # auto: minimum transcript length
+    COMBINED_PATTERNS_MAX_OUTPUT_TOKENS: int = 12000  # auto: expected output cap
+
+    # RATE LIMITS (per minute, shared by all workers; 0 disables a bucket)
+    OPENAI_RPM: int = 500
+    # off by default; when set it must cover the largest single call, i.e.
+    # LONG_TRANSCRIPT_TOKENS plus prompts and COMBINED_PATTERNS_MAX_OUTPUT_TOKENS
+    OPENAI_TPM: int = 0
+    OPENAI_EXPECTED_OUTPUT_TOKENS: int = 1000  # reserved per call, corrected after
+    ASSEMBLYAI_RPM: int = 300
+    RETRY_MAX_ATTEMPTS: int = 5
+    RETRY_BASE_DELAY: float = 1
+    RETRY_MAX_DELAY: float = 60
+
+    # JOBS
+    JOB_WORKERS_PER_PROCESS: int = 12  # meetings in flight per worker, any stage
+    # per-worker limits for each pipeline stage, so meetings overlap across stages
+    STAGE_UPLOAD_CONCURRENCY: int = 2
+    STAGE_TRANSCRIBE_CONCURRENCY: int = 8  # transcripts awaited at once
+    STAGE_LLM_CONCURRENCY: int = 4  # meetings running their patterns at once
+    JOB_POLL_INTERVAL: float = 5  # seconds between checks for jobs from elsewhere
+    JOB_LEASE_SECONDS: float = 120  # a dead worker's job is resumed after this
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_DELAY: float = 30  # multiplied by the attempt number
+    JOB_RETENTION_SECONDS: int = 7 * 24 * 3600  # finished jobs, 0 keeps forever
+    JOB_EVENTS_POLL_INTERVAL: float = 0.5  # SSE check for events from other workers
+    JOB_EVENTS_KEEPALIVE: float = 15
+    # events of finished jobs are deleted after this, all but the final state
+    JOB_EVENTS_RETENTION_SECONDS: int = 3600
+
+    # SCHEDULING (weighted fair share of job claims between departments)
+    DEPARTMENT_WEIGHTS: Dict[str, float] = {}  # e.g. {"trademan": 2}, default 1
+    # running jobs across all workers, e.g. {"dhoom studios": 4}; missing or 0 = no cap
+    DEPARTMENT_MAX_IN_FLIGHT: Dict[str, int] = {}
+    # shorter audio goes first; each second in the queue counts as this many bytes less
+    SCHEDULER_AGING_BYTES_PER_SECOND: int = 1024 * 1024
+    SCHEDULER_STATS_WINDOW: float = 900  # seconds of claims in the wait-time stats
+    STREAM_PATTERN_TOKENS: bool = False  # also push partial LLM output over SSE
+    STREAM_FLUSH_INTERVAL: float = 0.5  # seconds of tokens batched per delta event
+
+    # WORD TIMINGS (GET /meeting/words)
+    WORDS_MAX_RESULTS: int = 5000
+    UTTERANCE_GAP_MS: int = 1500  # a longer pause starts a new utterance
+
+    # CACHES
+    TRANSCRIPT_CACHE_ENABLED: bool = True
+    TRANSCRIPT_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024  # 1 GB
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MEMORY_ENTRIES: int = 256
+    RESPONSE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # 256 MB
+
+    # HTTP CONNECTION POOLS
+    HTTP_POOL_SIZE: int = 100  # total connections for the shared aiohttp session
+    HTTP_POOL_SIZE_PER_HOST: int = 20
+    HTTP_KEEPALIVE_TIMEOUT: float = 30  # seconds an idle connection is kept open
+    HTTP_CONNECT_TIMEOUT: float = 10
+    HTTP_READ_TIMEOUT: float = 300
+    HTTP_TOTAL_TIMEOUT: Optional[float] = None  # None: large uploads are not cut off
+    OPENAI_POOL_SIZE: int = 50
+    OPENAI_TIMEOUT: float = 600
 
     class Config:
         case_sensitive = False
-        env_file = f"{ROOT}/.env"
+        env_file = ENV_FILE
 
 
 try:
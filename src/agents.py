@@ -1,57 +1,117 @@
 import asyncio
+import json
 import time
-from dataclasses import dataclass
-from typing import List, Tuple
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 import aiofiles
 import aiohttp
-import assemblyai as aai
-from assemblyai import TranscriptStatus
-from openai import AsyncOpenAI
 
 from server import settings
 
 from .agents_schema import TranscribingConfig
-from .constants import KnowledgePattern
+from .cache import response_cache, response_cache_key, sha256_text
+from .chunking import MAP_INSTRUCTIONS, REDUCE_INSTRUCTIONS, split_transcript
+from .clients import http_clients
+from .constants import (
+    WEBHOOK_AUTH_HEADER,
+    JobStage,
+    KnowledgePattern,
+    TranscriptStatus,
+)
+from .metrics import (
+    LLM_TOKENS,
+    PATTERN_SECONDS,
+    UPLOAD_BYTES,
+    track_request,
+    track_stage,
+)
+from .patterns import pattern_registry
+from .rate_limit import rate_limiter, with_retries
+from .stages import stage_limits
+from .tokens import count_tokens
+from .transcript_waiter import transcript_waiter
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
+
+COMBINED_INSTRUCTIONS = (
+    "You are given several independent tasks to apply to the same meeting "
+    "transcript. Complete every task fully and independently, exactly as if it "
+    "were the only task, following its own output instructions. Return a JSON "
+    "object with one key per task name; each value is the complete output of "
+    "that task as a markdown string.\n\n"
+)
 
 
 @dataclass
 class AssemblyAiAgent:
+    """
+    Calls the AssemblyAI REST API through the shared aiohttp session.
+    """
 
-    def __post_init__(self):
-        aai.settings.api_key = settings.ASSEMBLYAI_API_KEY
+    @staticmethod
+    async def _iter_file_chunks(file_path: str) -> AsyncIterator[bytes]:
+        async with aiofiles.open(file_path, "rb") as file:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
 
-    async def _upload_local_file(self, file_path: str) -> dict:
+    @staticmethod
+    async def _count_bytes(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            UPLOAD_BYTES.inc(len(chunk))
+            yield chunk
+
+    async def upload_stream(self, chunks: AsyncIterable[bytes]) -> dict:
         """
-        Upload a local file to AssemblyAI for transcription.
+        Upload an async stream of audio chunks to AssemblyAI as a chunked body.
         """
-        settings.LOGGER.info(f"Uploading local file: {file_path}")
         url = f"{settings.ASSEMBLYAI_BASE_URL}/upload"
         headers = {
             "Authorization": settings.ASSEMBLYAI_API_KEY,
             "Content-Type": "application/octet-stream",
         }
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with aiofiles.open(file_path, "rb") as file:
-                    file_content = await file.read()
-                    settings.LOGGER.debug(
-                        f"File content read, size: {len(file_content)} bytes"
-                    )
-                    async with session.post(
-                        url, data=file_content, headers=headers
-                    ) as response:
-                        response.raise_for_status()
-                        result = await response.json()
-                        settings.LOGGER.info(f"File uploaded successfully: {file_path}")
-                        return result
-            except aiofiles.errors.AIOError as e:
-                settings.LOGGER.error(f"Error reading file {file_path}: {str(e)}")
-                raise
-            except aiohttp.ClientError as e:
-                settings.LOGGER.error(f"Error uploading file {file_path}: {str(e)}")
-                raise
+        await rate_limiter.acquire("assemblyai:requests", settings.ASSEMBLYAI_RPM)
+        session = http_clients.session
+        with track_request("assemblyai", "upload"):
+            async with session.post(
+                url, data=self._count_bytes(chunks), headers=headers
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+    async def _upload_local_file(self, file_path: str) -> dict:
+        """
+        Upload a local file to AssemblyAI for transcription.
+        """
+        settings.LOGGER.info(f"Uploading local file: {file_path}")
+        try:
+            result = await with_retries(
+                lambda: self.upload_stream(self._iter_file_chunks(file_path)),
+                description=f"Upload of {file_path}",
+            )
+            settings.LOGGER.info(f"File uploaded successfully: {file_path}")
+            return result
+        except aiohttp.ClientError as e:
+            settings.LOGGER.error(f"Error uploading file {file_path}: {str(e)}")
+            raise
+        except OSError as e:
+            settings.LOGGER.error(f"Error reading file {file_path}: {str(e)}")
+            raise
 
     async def _submit_audio_file(
         self,
@@ -64,132 +124,427 @@ class AssemblyAiAgent:
             "audio_url": public_audio_path,
             **config_dict,
         }
-
-        async with aiohttp.ClientSession() as session:
-            try:
+        if transcript_waiter.webhook_enabled:
+            data["webhook_url"] = (
+                f"{settings.ASSEMBLYAI_WEBHOOK_BASE_URL}/meeting/assemblyai-webhook"
+            )
+            data["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER
+            data["webhook_auth_header_value"] = settings.ASSEMBLYAI_WEBHOOK_SECRET
+
+        async def _post() -> dict:
+            await rate_limiter.acquire("assemblyai:requests", settings.ASSEMBLYAI_RPM)
+            session = http_clients.session
+            with track_request("assemblyai", "submit"):
                 async with session.post(url, json=data, headers=headers) as response:
                     response.raise_for_status()
-                    transcript = await response.json()
-            except Exception as err:
-                settings.LOGGER.error(
-                    f"Transcription request failed for {public_audio_path} because {err}"
-                )
-                return
+                    return await response.json()
+
+        try:
+            transcript = await with_retries(
+                _post, description=f"Transcription request for {public_audio_path}"
+            )
+        except Exception as err:
+            settings.LOGGER.error(
+                f"Transcription request failed for {public_audio_path} because {err}"
+            )
+            return
+
+        id, status = transcript["id"], transcript["status"]
+
+        settings.LOGGER.info(f"Transcription ID: {id}")
+
+        if status == TranscriptStatus.ERROR.value:
+            settings.LOGGER.error(f"Transcription error for {public_audio_path}.")
+        else:
+            settings.LOGGER.info(f"Transcription is {status} for {public_audio_path}.")
+            return id
+
+    async def _get_transcript_response(
+        self, transcript_id: str, audio_duration: Optional[float] = None
+    ):
+        return await transcript_waiter.wait(transcript_id, audio_duration)
 
-            id, status = transcript["id"], transcript["status"]
+    async def transcribe_audio(
+        self,
+        config: TranscribingConfig,
+        *,
+        file_path: str,
+        audio_url: Optional[str] = None,
+        transcript_id: Optional[str] = None,
+        audio_duration: Optional[float] = None,
+        on_checkpoint: Optional[Callable[..., Awaitable]] = None,
+    ) -> Tuple[dict, str]:
+        """
+        Upload, submit and wait for a transcript. ``audio_url`` and
+        ``transcript_id`` let a resumed job skip the steps it already did;
+        ``on_checkpoint(stage, **data)`` is awaited after each step.
+        """
+        # audio_url is set when the file was already streamed to AssemblyAI
+        _audio_url = audio_url
+        if not transcript_id:
+            if not _audio_url:
+                with track_stage("upload"):
+                    async with stage_limits.upload:
+                        upload_response = await self._upload_local_file(file_path)
+                _audio_url = upload_response.get("upload_url")
+                if _audio_url and on_checkpoint:
+                    await on_checkpoint(JobStage.UPLOADED, audio_url=_audio_url)
+            if not _audio_url:
+                raise ValueError("Audio URL not found in upload response")
+
+            with track_stage("submit"):
+                transcript_id = await self._submit_audio_file(
+                    config_dict=config.model_dump(), public_audio_path=_audio_url
+                )
+            if not transcript_id:
+                return {}, TranscriptStatus.ERROR.value
+            if on_checkpoint:
+                await on_checkpoint(JobStage.SUBMITTED, transcript_id=transcript_id)
+
+        with track_stage("transcribe"):
+            async with stage_limits.transcribe:
+                transcript_data, transcript_status = (
+                    await self._get_transcript_response(transcript_id, audio_duration)
+                )
+        return transcript_data, transcript_status
 
-            print(f"Transcription ID: {id}")
 
-            if status == TranscriptStatus.error.value:
-                settings.LOGGER.error(f"Transcription error for {public_audio_path}.")
-            else:
-                settings.LOGGER.info(
-                    f"Transcription is {status} for {public_audio_path}."
-                )
-                return id
+@dataclass
+class StreamingUpload:
+    """
+    Feeds chunks to an AssemblyAI upload running in the background, so the
+    upload overlaps with whatever produces the chunks (e.g. saving to disk).
+    """
 
-    async def _get_transcript_response(self, transcript_id: str):
-        url = f"{settings.ASSEMBLYAI_BASE_URL}/transcript/{transcript_id}"
-        headers = {"Authorization": settings.ASSEMBLYAI_API_KEY}
+    agent: AssemblyAiAgent
+    _queue: asyncio.Queue = field(init=False)
+    _task: asyncio.Task = field(init=False)
 
-        transcript = {}
-        status = None
+    def __post_init__(self):
+        self._queue = asyncio.Queue(maxsize=settings.TEE_UPLOAD_QUEUE_CHUNKS)
+        self._task = asyncio.create_task(self.agent.upload_stream(self._drain()))
 
-        _start_time = time.time()
+    async def _drain(self) -> AsyncIterator[bytes]:
+        while (chunk := await self._queue.get()) is not None:
+            yield chunk
 
-        async with aiohttp.ClientSession() as session:
-            while True:
-                settings.LOGGER.info(
-                    f"Requesting transcription for SRT-ID: {transcript_id}"
-                )
+    async def feed(self, chunk: Optional[bytes]):
+        # stop feeding once the upload has failed instead of blocking on a full queue
+        if self._task.done():
+            return
+        put = asyncio.ensure_future(self._queue.put(chunk))
+        await asyncio.wait({put, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
 
-                _elapsed_time = time.time() - _start_time
-                async with session.get(url, headers=headers) as response:
-                    if response.status in [400, 500] or _elapsed_time > 300:
-                        status = TranscriptStatus.error.value
-                        break
-                    else:
-                        task: dict = await response.json()
-                        _status = task["status"]
-
-                        if _status == TranscriptStatus.error.value:
-                            settings.LOGGER.error(
-                                f"Transcription error for {transcript_id}"
-                            )
-                            status = _status
-                            break
-
-                        elif (
-                            _status == TranscriptStatus.processing.value
-                            or _status == TranscriptStatus.queued.value
-                        ):
-                            await asyncio.sleep(5)
-
-                        else:
-                            # check for spoken words
-                            if len(task["words"]) >= 10:
-                                transcript = task
-                                status = _status
-                                break
-                            else:
-                                settings.LOGGER.error(
-                                    f"Transcription {transcript_id} has less than 10 spoken words. "
-                                )
-                                status = "less_than_10_words"
-                                break
-
-        return transcript, status
+    async def close(self):
+        await self.feed(None)
 
-    async def transcribe_audio(
-        self, config: TranscribingConfig, *, file_path: str
-    ) -> Tuple[dict, str]:
-        upload_response = await self._upload_local_file(file_path)
-        _audio_url = upload_response.get("upload_url")
-        if not _audio_url:
-            raise ValueError("Audio URL not found in upload response")
+    def abort(self):
+        self._task.cancel()
 
-        transcript_id = await self._submit_audio_file(
-            config_dict=config.model_dump(), public_audio_path=_audio_url
-        )
-        transcript_data, transcript_status = await self._get_transcript_response(
-            transcript_id
-        )
-        return transcript_data, transcript_status
+    async def audio_url(self) -> Optional[str]:
+        try:
+            result = await self._task
+        except (asyncio.CancelledError, aiohttp.ClientError) as e:
+            settings.LOGGER.error(f"Streaming upload failed: {str(e)}")
+            return None
+        return result.get("upload_url")
 
 
 @dataclass
 class OpenAiAgent:
     knowledge_patterns: List[KnowledgePattern]
     transcript: str
+    transcript_data: Optional[dict] = None  # raw AssemblyAI response, if any
+    # called with (pattern, text) as output tokens arrive; enables streaming
+    on_delta: Optional[Callable[[str, str], Awaitable]] = None
+    # someone is watching results arrive (e.g. an SSE client of the job)
+    watched: bool = False
 
     def __post_init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = http_clients.openai
+        self.transcript_sha256 = sha256_text(self.transcript)
+        self.transcript_tokens = count_tokens(self.transcript)
+
+        # long transcripts are processed map-reduce style, short ones untouched
+        self.chunks = []
+        if self.transcript_tokens > settings.LONG_TRANSCRIPT_TOKENS:
+            self.chunks = split_transcript(
+                self.transcript,
+                self.transcript_data,
+                max_tokens=settings.CHUNK_TOKENS,
+                overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+            )
+            self._chunk_semaphore = asyncio.Semaphore(settings.CHUNK_PARALLELISM)
+
+    async def _stream_completion(
+        self, pattern: str, model_name: str, messages: List[dict]
+    ) -> Tuple[str, Optional["CompletionUsage"]]:
+        stream = await self.client.chat.completions.create(
+            model=model_name,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        parts, pending, usage = [], [], None
+        last_flush = time.monotonic()
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                pending.append(chunk.choices[0].delta.content)
+                # batch tokens so listeners get a few updates per second
+                if time.monotonic() - last_flush >= settings.STREAM_FLUSH_INTERVAL:
+                    await self.on_delta(pattern, "".join(pending))
+                    pending, last_flush = [], time.monotonic()
+        if pending:
+            await self.on_delta(pattern, "".join(pending))
+        return "".join(parts), usage
+
+    async def _complete(
+        self,
+        system_prompt: str,
+        content: str,
+        model_name: str,
+        stream_pattern: Optional[str] = None,
+        response_format: Optional[dict] = None,
+        expected_output_tokens: Optional[int] = None,
+        pattern: Optional[str] = None,
+    ) -> str:
+        estimated_tokens = (
+            count_tokens(system_prompt, model_name)
+            + count_tokens(content, model_name)
+            + (expected_output_tokens or settings.OPENAI_EXPECTED_OUTPUT_TOKENS)
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content},
+        ]
 
-    @staticmethod
-    async def __get_prompt(pattern: str) -> str:
-        prompt_path = f"patterns/create_{pattern}.md"
-        async with aiofiles.open(prompt_path, mode="r") as file:
-            return await file.read()
+        async def _create() -> Tuple[str, Optional["CompletionUsage"]]:
+            await rate_limiter.acquire("openai:requests", settings.OPENAI_RPM)
+            await rate_limiter.acquire(
+                "openai:tokens", settings.OPENAI_TPM, estimated_tokens
+            )
+            with track_request("openai", "completion"):
+                if stream_pattern and self.on_delta:
+                    return await self._stream_completion(
+                        stream_pattern, model_name, messages
+                    )
+                extra = {"response_format": response_format} if response_format else {}
+                response = await self.client.chat.completions.create(
+                    model=model_name, messages=messages, **extra
+                )
+            return response.choices[0].message.content, response.usage
+
+        response, usage = await with_retries(_create, description="OpenAI completion")
+        if usage:
+            label = pattern or stream_pattern or "-"
+            LLM_TOKENS.labels(label, model_name, "prompt").inc(usage.prompt_tokens)
+            LLM_TOKENS.labels(label, model_name, "completion").inc(
+                usage.completion_tokens
+            )
+            await rate_limiter.adjust(
+                "openai:tokens",
+                settings.OPENAI_TPM,
+                usage.total_tokens - estimated_tokens,
+            )
+        return response
+
+    async def _map_chunk(
+        self, pattern: str, prompt: str, chunk: str, model_name: str
+    ) -> str:
+        async with self._chunk_semaphore:
+            return await self._complete(
+                MAP_INSTRUCTIONS + prompt, chunk, model_name, pattern=pattern
+            )
+
+    async def _map_reduce(self, pattern: str, prompt: str, model_name: str) -> str:
+        settings.LOGGER.info(
+            f"Processing pattern {pattern} over {len(self.chunks)} transcript chunks"
+        )
+        partials = await asyncio.gather(
+            *[
+                self._map_chunk(pattern, prompt, chunk, model_name)
+                for chunk in self.chunks
+            ]
+        )
+        merged = "\n\n".join(
+            f"## PART {i}\n\n{partial}" for i, partial in enumerate(partials, 1)
+        )
+        return await self._complete(
+            prompt, REDUCE_INSTRUCTIONS + merged, model_name, stream_pattern=pattern
+        )
+
+    async def _cached_result(
+        self, pattern: str, prompt: str, model_name: str
+    ) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        Return (cache key, cached result); the key is None if caching is off.
+        """
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None, None
+        cache_key = response_cache_key(prompt, self.transcript_sha256, model_name)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            settings.LOGGER.info(f"Response cache hit for pattern {pattern}")
+        return cache_key, cached
 
     async def _process_pattern(self, pattern: str, model_name: str = "gpt-4o") -> dict:
-        prompt = await self.__get_prompt(pattern)
-        response = await self.client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": self.transcript},
-            ],
-        )
-        return {
+        prompt = pattern_registry.get(pattern).prompt
+
+        cache_key, cached = await self._cached_result(pattern, prompt, model_name)
+        if cached is not None:
+            return cached
+
+        with PATTERN_SECONDS.labels(pattern).time():
+            if self.chunks:
+                response = await self._map_reduce(pattern, prompt, model_name)
+            else:
+                response = await self._complete(
+                    prompt, self.transcript, model_name, stream_pattern=pattern
+                )
+        result = {
             "pattern": pattern,
-            "response": response.choices[0].message.content,
+            "response": response,
         }
+        if cache_key:
+            await response_cache.set(cache_key, result)
+        return result
 
-    async def process_all_patterns(self) -> List[dict]:
-        tasks = [
-            self._process_pattern(pattern.value) for pattern in self.knowledge_patterns
-        ]
-        return await asyncio.gather(*tasks)
+    async def _process_pattern_safely(
+        self,
+        pattern: str,
+        on_result: Optional[Callable[[dict], Awaitable]],
+    ) -> dict:
+        try:
+            result = await self._process_pattern(pattern)
+        except Exception as e:
+            settings.LOGGER.error(f"Pattern {pattern} failed: {str(e)}")
+            return {"pattern": pattern, "response": None, "error": str(e)}
+
+        if on_result:
+            await on_result(result)
+        return result
+
+    def _use_combined(self, patterns: List[str]) -> bool:
+        mode = settings.COMBINED_PATTERNS_MODE
+        if mode == "off" or self.chunks or len(patterns) < 2:
+            return False
+        if mode == "on":
+            return True
+        if self.on_delta or self.watched:
+            # one combined response arrives all at once, at the very end
+            return False
+        # worth it once the repeated transcript outweighs the extra output risk
+        output_tokens = len(patterns) * settings.OPENAI_EXPECTED_OUTPUT_TOKENS
+        return (
+            self.transcript_tokens >= settings.COMBINED_PATTERNS_MIN_TOKENS
+            and output_tokens <= settings.COMBINED_PATTERNS_MAX_OUTPUT_TOKENS
+        )
+
+    async def _process_combined(
+        self,
+        patterns: List[str],
+        on_result: Optional[Callable[[dict], Awaitable]],
+        model_name: str = "gpt-4o",
+    ) -> Dict[str, dict]:
+        """
+        Run several patterns in one request that returns a JSON object with a
+        section per pattern. Returns the results that came back valid; the
+        caller processes any missing pattern on its own.
+        """
+        results, prompts, cache_keys = {}, {}, {}
+        for pattern in patterns:
+            prompt = pattern_registry.get(pattern).prompt
+            cache_key, cached = await self._cached_result(pattern, prompt, model_name)
+            if cached is not None:
+                results[pattern] = cached
+                if on_result:
+                    await on_result(cached)
+            else:
+                prompts[pattern], cache_keys[pattern] = prompt, cache_key
+        if len(prompts) < 2:
+            return results
+
+        settings.LOGGER.info(f"Processing patterns {list(prompts)} in one request")
+        system_prompt = COMBINED_INSTRUCTIONS + "\n\n".join(
+            f"# TASK `{pattern}`\n\n{prompt}" for pattern, prompt in prompts.items()
+        )
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "pattern_sections",
+                "strict": True,
+                "schema": {
+                    "type": "object",
+                    "properties": {p: {"type": "string"} for p in prompts},
+                    "required": list(prompts),
+                    "additionalProperties": False,
+                },
+            },
+        }
+        try:
+            with PATTERN_SECONDS.labels("combined").time():
+                response = await self._complete(
+                    system_prompt,
+                    self.transcript,
+                    model_name,
+                    response_format=response_format,
+                    expected_output_tokens=len(prompts)
+                    * settings.OPENAI_EXPECTED_OUTPUT_TOKENS,
+                    pattern="combined",
+                )
+            sections = json.loads(response)
+        except Exception as e:
+            settings.LOGGER.warning(
+                f"Combined request failed, processing patterns one by one: {str(e)}"
+            )
+            return results
+        if not isinstance(sections, dict):
+            sections = {}
+
+        for pattern in prompts:
+            section = sections.get(pattern)
+            if not isinstance(section, str) or not section.strip():
+                settings.LOGGER.warning(
+                    f"Combined request returned no valid section for {pattern}"
+                )
+                continue
+            result = {"pattern": pattern, "response": section.strip()}
+            if cache_keys[pattern]:
+                await response_cache.set(cache_keys[pattern], result)
+            if on_result:
+                await on_result(result)
+            results[pattern] = result
+        return results
+
+    async def process_all_patterns(
+        self,
+        done: Optional[Dict[str, dict]] = None,
+        on_result: Optional[Callable[[dict], Awaitable]] = None,
+    ) -> List[dict]:
+        """
+        Results keep the order of knowledge_patterns. A pattern that fails has
+        ``response`` set to None and an ``error`` message instead of failing
+        the whole meeting. Patterns already in ``done`` are not processed
+        again; ``on_result`` is awaited as each successful pattern finishes.
+        """
+        done = done or {}
+        pending = [p.value for p in self.knowledge_patterns if p.value not in done]
+
+        combined = {}
+        if self._use_combined(pending):
+            combined = await self._process_combined(pending, on_result)
+            pending = [p for p in pending if p not in combined]
+
+        results = await asyncio.gather(
+            *[self._process_pattern_safely(p, on_result) for p in pending]
+        )
+        by_pattern = {**done, **combined, **{r["pattern"]: r for r in results}}
+        return [by_pattern[p.value] for p in self.knowledge_patterns]
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
-import assemblyai as aai
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from .constants import TRANSCRIPT_ID_PATTERN, SpeechModel
 
 
 class TranscribingConfig(BaseModel):
@@ -8,4 +9,9 @@ class TranscribingConfig(BaseModel):
     # disfluencies: bool = False  # Transcribe Filler Words, like "umm"
     # punctuate: bool = True  # Automatic Punctuation
     # format_text: bool = True  # Text Formatting
-    speech_model: str = aai.SpeechModel.best.value
+    speech_model: str = SpeechModel.BEST.value
+
+
+class TranscriptWebhook(BaseModel):
+    transcript_id: str = Field(pattern=TRANSCRIPT_ID_PATTERN, max_length=128)
+    status: str
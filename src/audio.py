@@ -0,0 +1,211 @@
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+from server import settings
+
+_SILENCE_MIN_SECONDS = 0.3
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_SILENCE_START = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+_SILENCE_END = re.compile(r"silence_end: (\d+(?:\.\d+)?)")
+
+
+@dataclass
+class PreprocessResult:
+    path: str
+    input_bytes: int
+    output_bytes: int
+    seconds: float
+    # leading silence cut from the audio; add it to the transcript's timestamps
+    offset_ms: int = 0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.input_bytes - self.output_bytes
+
+
+def _silence_command(input_path: str) -> list:
+    # silencedetect streams, so memory stays flat however long the recording
+    return [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        input_path,
+        "-vn",
+        "-af",
+        f"aformat=channel_layouts=mono,silencedetect="
+        f"n={settings.AUDIO_SILENCE_THRESHOLD_DB}dB:d={_SILENCE_MIN_SECONDS}",
+        "-f",
+        "null",
+        "-",
+    ]
+
+
+def _parse_silence(stderr: str) -> Tuple[float, Optional[float]]:
+    """
+    Return (start, end) seconds of the audio between leading and trailing
+    silence, from ffmpeg's silencedetect output. end is None when the
+    recording does not end in silence.
+    """
+    duration = None
+    if match := _DURATION.search(stderr):
+        hours, minutes, seconds = match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    silences = []
+    for line in stderr.splitlines():
+        if match := _SILENCE_START.search(line):
+            silences.append([max(float(match.group(1)), 0.0), None])
+        elif (match := _SILENCE_END.search(line)) and silences:
+            silences[-1][1] = float(match.group(1))
+
+    start, end = 0.0, None
+    if silences and silences[0][0] <= 0.01 and silences[0][1] is not None:
+        start = silences[0][1]
+    if silences:
+        last_start, last_end = silences[-1]
+        # a silence running into the end of the file has no end, or ends at it
+        ends_file = last_end is None or (
+            duration is not None and last_end >= duration - 0.05
+        )
+        if ends_file and last_start > start:
+            end = last_start
+    return start, end
+
+
+def _ffmpeg_command(
+    input_path: str, output_path: str, start: float = 0.0, end: Optional[float] = None
+) -> list:
+    trim = []
+    if start:
+        trim += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        trim += ["-t", f"{end - start:.3f}"]
+    return [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-y",
+        *trim,
+        "-i",
+        input_path,
+        "-vn",
+        "-af",
+        "aformat=sample_fmts=s16:channel_layouts=mono,"
+        f"aresample={settings.AUDIO_PREPROCESS_SAMPLE_RATE}",
+        "-ac",
+        "1",
+        "-ar",
+        str(settings.AUDIO_PREPROCESS_SAMPLE_RATE),
+        "-c:a",
+        "libopus",
+        "-b:a",
+        settings.AUDIO_PREPROCESS_BITRATE,
+        "-application",
+        "voip",
+        output_path,
+    ]
+
+
+def _preprocess_sync(input_path: str, output_path: str) -> PreprocessResult:
+    # runs in a pool process: ffmpeg and the file I/O never touch the event loop
+    started = time.monotonic()
+    start, end = 0.0, None
+    if settings.AUDIO_PREPROCESS_TRIM_SILENCE:
+        detected = subprocess.run(
+            _silence_command(input_path),
+            check=True,
+            capture_output=True,
+            timeout=settings.AUDIO_PREPROCESS_TIMEOUT,
+        )
+        start, end = _parse_silence(detected.stderr.decode(errors="replace"))
+
+    tmp_path = f"{output_path}.tmp.ogg"
+    subprocess.run(
+        _ffmpeg_command(input_path, tmp_path, start, end),
+        check=True,
+        capture_output=True,
+        timeout=settings.AUDIO_PREPROCESS_TIMEOUT,
+    )
+    os.replace(tmp_path, output_path)
+    return PreprocessResult(
+        path=output_path,
+        input_bytes=os.path.getsize(input_path),
+        output_bytes=os.path.getsize(output_path),
+        seconds=time.monotonic() - started,
+        offset_ms=round(start * 1000),
+    )
+
+
+@dataclass
+class AudioPreprocessor:
+    """
+    Downmixes to mono, resamples, trims leading/trailing silence and encodes
+    to Opus before upload, in a process pool. Any failure falls back to
+    uploading the original file. Silence is found in a separate
+    silencedetect pass and cut with -ss/-t; the leading cut is returned as
+    ``offset_ms`` so transcript timestamps can be mapped back to the
+    original recording.
+    """
+
+    _pool: Optional[ProcessPoolExecutor] = field(default=None, init=False)
+
+    @property
+    def enabled(self) -> bool:
+        return settings.AUDIO_PREPROCESS_ENABLED and shutil.which("ffmpeg") is not None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.AUDIO_PREPROCESS_WORKERS
+            )
+        return self._pool
+
+    async def process(self, input_path: str) -> Optional[PreprocessResult]:
+        output_path = f"{os.path.splitext(input_path)[0]}.preprocessed.ogg"
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self.pool, _preprocess_sync, input_path, output_path
+            )
+        except subprocess.CalledProcessError as e:
+            settings.LOGGER.warning(
+                f"Preprocessing {input_path} failed, uploading the original: "
+                f"{e.stderr.decode(errors='replace').strip()}"
+            )
+            return None
+        except Exception as e:
+            settings.LOGGER.warning(
+                f"Preprocessing {input_path} failed, uploading the original: {str(e)}"
+            )
+            return None
+
+        if result.output_bytes >= result.input_bytes:
+            # already compact (e.g. a low bitrate voice memo)
+            await asyncio.to_thread(os.remove, result.path)
+            return None
+
+        settings.LOGGER.info(
+            f"Preprocessed {input_path}: {result.input_bytes} -> "
+            f"{result.output_bytes} bytes in {result.seconds:.1f}s"
+        )
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+audio_preprocessor = AudioPreprocessor()
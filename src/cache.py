@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from server import settings
+
+from .agents_schema import TranscribingConfig
+from .metrics import CACHE_LOOKUPS, counter_totals
+
+
+@dataclass
+class DiskLRUCache:
+    """
+    JSON entries stored one file per key, evicted least-recently-used (by
+    mtime, which is refreshed on every hit) once the directory exceeds
+    ``max_bytes``. Safe to share between worker processes: writes are atomic
+    renames and a missing file is simply a miss. Hits and misses are counted
+    in ``CACHE_LOOKUPS`` under ``name``, so the stats cover every worker.
+    """
+
+    name: str
+    directory: str
+    max_bytes: int
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _get_sync(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _set_sync(self, key: str, value: dict):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        self._evict_sync()
+
+    def _evict_sync(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await asyncio.to_thread(self._get_sync, key)
+        CACHE_LOOKUPS.labels(self.name, "miss" if value is None else "hit").inc()
+        return value
+
+    async def contains(self, key: str) -> bool:
+        """
+        Whether ``key`` is cached, without counting a lookup or refreshing it.
+        """
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+
+    async def set(self, key: str, value: dict):
+        try:
+            await asyncio.to_thread(self._set_sync, key, value)
+        except OSError as e:
+            settings.LOGGER.error(f"Error writing cache entry {key}: {str(e)}")
+
+    def stats(self) -> dict:
+        totals = counter_totals("cache_lookups", "cache", "result")
+        return {
+            "hits": int(totals.get((self.name, "hit"), 0)),
+            "misses": int(totals.get((self.name, "miss"), 0)),
+        }
+
+
+@dataclass
+class TieredCache:
+    """
+    In-memory LRU tier in front of a DiskLRUCache. The memory tier is per
+    process; the disk tier is shared by all workers.
+    """
+
+    disk: DiskLRUCache
+    max_entries: int
+    _memory: OrderedDict = field(default_factory=OrderedDict, init=False)
+
+    def _remember(self, key: str, value: dict):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[dict]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            CACHE_LOOKUPS.labels(self.disk.name, "memory_hit").inc()
+            return self._memory[key]
+
+        value = await self.disk.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self._remember(key, value)
+        await self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        totals = counter_totals("cache_lookups", "cache", "result")
+        return {
+            "memory_hits": int(totals.get((self.disk.name, "memory_hit"), 0)),
+            "disk_hits": int(totals.get((self.disk.name, "hit"), 0)),
+            "misses": int(totals.get((self.disk.name, "miss"), 0)),
+        }
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def transcript_cache_key(audio_sha256: str, config: TranscribingConfig) -> str:
+    config_json = json.dumps(config.model_dump(), sort_keys=True)
+    return hashlib.sha256(f"{audio_sha256}:{config_json}".encode()).hexdigest()
+
+
+transcript_cache = DiskLRUCache(
+    name="transcripts",
+    directory=os.path.join(settings.DATA_DIR, "cache", "transcripts"),
+    max_bytes=settings.TRANSCRIPT_CACHE_MAX_BYTES,
+)
+
+
+def response_cache_key(prompt: str, transcript_sha256: str, model_name: str) -> str:
+    # the prompt hash changes whenever a pattern file is edited, which
+    # invalidates every response generated from the old version
+    return sha256_text(f"{sha256_text(prompt)}:{transcript_sha256}:{model_name}")
+
+
+response_cache = TieredCache(
+    disk=DiskLRUCache(
+        name="responses",
+        directory=os.path.join(settings.DATA_DIR, "cache", "responses"),
+        max_bytes=settings.RESPONSE_CACHE_MAX_BYTES,
+    ),
+    max_entries=settings.RESPONSE_CACHE_MEMORY_ENTRIES,
+)
@@ -0,0 +1,238 @@
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from server import settings
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class CatalogEntry:
+    save_dir: str
+    meeting_subject: str
+    department: str
+    language: str
+    patterns: List[str]
+    output_path: str
+    transcript: str
+    content: str
+    job_id: Optional[str] = None
+    created_at: Optional[float] = None
+
+
+@dataclass
+class MeetingCatalog:
+    """
+    SQLite index of finished meetings with an FTS5 table over the subject,
+    department, patterns, transcript and generated content, so meetings can be
+    listed and searched without walking ``UPLOAD_DIR``.
+    """
+
+    db_path: str
+    _schema_ready: bool = field(default=False, init=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+            self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS meetings (
+                id INTEGER PRIMARY KEY,
+                save_dir TEXT NOT NULL UNIQUE,
+                job_id TEXT,
+                meeting_subject TEXT NOT NULL,
+                department TEXT NOT NULL,
+                language TEXT,
+                patterns TEXT NOT NULL,
+                output_path TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS meetings_department "
+            "ON meetings (department, created_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS meetings_created ON meetings (created_at)"
+        )
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS meetings_fts USING fts5(
+                meeting_subject, department, patterns, transcript, content,
+                tokenize = 'porter unicode61'
+            )
+            """)
+
+    def upsert_sync(self, entry: CatalogEntry):
+        now = time.time()
+        patterns = ",".join(entry.patterns)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO meetings (save_dir, job_id, meeting_subject, department, "
+                "language, patterns, output_path, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (save_dir) DO UPDATE SET job_id = excluded.job_id, "
+                "meeting_subject = excluded.meeting_subject, "
+                "department = excluded.department, language = excluded.language, "
+                "patterns = excluded.patterns, output_path = excluded.output_path, "
+                "updated_at = excluded.updated_at",
+                (
+                    entry.save_dir,
+                    entry.job_id,
+                    entry.meeting_subject,
+                    entry.department,
+                    entry.language,
+                    patterns,
+                    entry.output_path,
+                    entry.created_at or now,
+                    now,
+                ),
+            )
+            row_id = conn.execute(
+                "SELECT id FROM meetings WHERE save_dir = ?", (entry.save_dir,)
+            ).fetchone()["id"]
+            conn.execute("DELETE FROM meetings_fts WHERE rowid = ?", (row_id,))
+            conn.execute(
+                "INSERT INTO meetings_fts (rowid, meeting_subject, department, "
+                "patterns, transcript, content) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    row_id,
+                    entry.meeting_subject,
+                    entry.department,
+                    patterns.replace(",", " "),
+                    entry.transcript,
+                    entry.content,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def remove_sync(self, save_dir: str):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM meetings WHERE save_dir = ?", (save_dir,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM meetings_fts WHERE rowid = ?", (row["id"],))
+                conn.execute("DELETE FROM meetings WHERE id = ?", (row["id"],))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        meeting = {
+            "dir_search_path": row["save_dir"].replace("/", "+"),
+            "job_id": row["job_id"],
+            "meeting_subject": row["meeting_subject"],
+            "department": row["department"],
+            "language": row["language"],
+            "patterns": row["patterns"].split(",") if row["patterns"] else [],
+            "created_at": row["created_at"],
+        }
+        if "snippet" in row.keys():
+            meeting["snippet"] = row["snippet"]
+        return meeting
+
+    def _list_sync(
+        self, department: Optional[str], limit: int, offset: int
+    ) -> Tuple[int, List[dict]]:
+        where, params = "", []
+        if department:
+            where, params = "WHERE department = ?", [department]
+        conn = self._connect()
+        try:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM meetings {where}", params
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM meetings {where} ORDER BY created_at DESC "
+                "LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        finally:
+            conn.close()
+        return total, [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _plain_query(query: str) -> str:
+        # every word as a quoted term, for input that is not valid FTS5 syntax
+        return " ".join(f'"{token}"' for token in _TOKEN.findall(query))
+
+    def _search_sync(
+        self, query: str, department: Optional[str], limit: int, offset: int
+    ) -> Tuple[int, List[dict]]:
+        where, params = "meetings_fts MATCH ?", []
+        if department:
+            where, params = f"{where} AND m.department = ?", [department]
+
+        conn = self._connect()
+        try:
+            for match in (query, self._plain_query(query)):
+                if not match:
+                    return 0, []
+                try:
+                    total = conn.execute(
+                        "SELECT COUNT(*) FROM meetings_fts "
+                        f"JOIN meetings m ON m.id = meetings_fts.rowid WHERE {where}",
+                        [match, *params],
+                    ).fetchone()[0]
+                    rows = conn.execute(
+                        "SELECT m.*, snippet(meetings_fts, -1, '**', '**', '...', 24) "
+                        "AS snippet FROM meetings_fts "
+                        f"JOIN meetings m ON m.id = meetings_fts.rowid WHERE {where} "
+                        "ORDER BY bm25(meetings_fts, 10.0, 2.0, 2.0, 1.0, 1.0) "
+                        "LIMIT ? OFFSET ?",
+                        [match, *params, limit, offset],
+                    ).fetchall()
+                    break
+                except sqlite3.OperationalError:
+                    continue
+            else:
+                return 0, []
+        finally:
+            conn.close()
+        return total, [self._to_dict(row) for row in rows]
+
+    async def upsert(self, entry: CatalogEntry):
+        await asyncio.to_thread(self.upsert_sync, entry)
+
+    async def list(
+        self, department: Optional[str] = None, limit: int = 20, offset: int = 0
+    ) -> Tuple[int, List[dict]]:
+        return await asyncio.to_thread(self._list_sync, department, limit, offset)
+
+    async def search(
+        self,
+        query: str,
+        department: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[int, List[dict]]:
+        return await asyncio.to_thread(
+            self._search_sync, query, department, limit, offset
+        )
+
+
+meeting_catalog = MeetingCatalog(db_path=os.path.join(settings.DATA_DIR, "catalog.db"))
@@ -0,0 +1,82 @@
+import re
+from typing import List, Optional
+
+from .tokens import count_tokens
+
+MAP_INSTRUCTIONS = (
+    "You are given one part of a longer meeting transcript. Apply the task "
+    "below to this part only and extract every relevant detail; your output "
+    "will be merged with the outputs for the other parts.\n\n"
+)
+REDUCE_INSTRUCTIONS = (
+    "The following are partial results, each produced from one consecutive "
+    "part of the same long meeting transcript. Merge them into a single "
+    "output for the whole meeting, removing duplicates.\n\n"
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _transcript_units(text: str, transcript_data: Optional[dict]) -> List[str]:
+    """
+    Split a transcript into units that should not be cut: speaker utterances
+    when AssemblyAI diarized the audio, sentences otherwise.
+    """
+    utterances = (transcript_data or {}).get("utterances")
+    if utterances:
+        return [f"Speaker {u['speaker']}: {u['text']}" for u in utterances]
+    return [s for s in _SENTENCE_END.split(text) if s]
+
+
+def _split_oversized(unit: str, max_tokens: int) -> List[str]:
+    words = unit.split(" ")
+    # approximate tokens per word from the whole unit to avoid counting each word
+    tokens_per_word = max(count_tokens(unit) / max(len(words), 1), 1)
+    words_per_part = max(int(max_tokens / tokens_per_word), 1)
+    return [
+        " ".join(words[i : i + words_per_part])
+        for i in range(0, len(words), words_per_part)
+    ]
+
+
+def split_transcript(
+    text: str,
+    transcript_data: Optional[dict],
+    max_tokens: int,
+    overlap_tokens: int,
+) -> List[str]:
+    """
+    Greedily pack transcript units into chunks of at most ``max_tokens``,
+    repeating up to ``overlap_tokens`` of trailing units at the start of the
+    next chunk so context is not lost at the boundary.
+    """
+    units = []
+    for unit in _transcript_units(text, transcript_data):
+        tokens = count_tokens(unit)
+        if tokens > max_tokens:
+            units.extend(
+                (part, count_tokens(part))
+                for part in _split_oversized(unit, max_tokens)
+            )
+        else:
+            units.append((unit, tokens))
+
+    chunks, current, current_tokens = [], [], 0
+    for unit, tokens in units:
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(u for u, _ in current))
+
+            overlap, overlap_size = [], 0
+            for prev in reversed(current):
+                if overlap_size + prev[1] > overlap_tokens:
+                    break
+                overlap.insert(0, prev)
+                overlap_size += prev[1]
+            current, current_tokens = overlap, overlap_size
+
+        current.append((unit, tokens))
+        current_tokens += tokens
+
+    if current:
+        chunks.append(" ".join(u for u, _ in current))
+    return chunks
@@ -0,0 +1,82 @@
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import aiohttp
+
+from server import settings
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@dataclass
+class HttpClients:
+    """
+    Process-wide, connection-pooled clients shared by every agent.
+
+    The clients are created lazily on first use (so scripts work without the
+    app lifespan) and are opened/closed explicitly by the FastAPI lifespan,
+    i.e. in each worker after the fork, never in a preloading master. openai
+    and httpx are only imported then, which keeps them out of the app import.
+    """
+
+    _session: Optional[aiohttp.ClientSession] = field(default=None, init=False)
+    _openai: Optional["AsyncOpenAI"] = field(default=None, init=False)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_SIZE,
+                limit_per_host=settings.HTTP_POOL_SIZE_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=settings.HTTP_TOTAL_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                sock_read=settings.HTTP_READ_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        if self._openai is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_POOL_SIZE,
+                    max_keepalive_connections=settings.OPENAI_POOL_SIZE,
+                    keepalive_expiry=settings.HTTP_KEEPALIVE_TIMEOUT,
+                ),
+                timeout=httpx.Timeout(
+                    settings.OPENAI_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT
+                ),
+            )
+            # retries are handled by rate_limit.with_retries
+            self._openai = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                http_client=http_client,
+                max_retries=0,
+            )
+        return self._openai
+
+    async def start(self):
+        settings.LOGGER.info("Opening shared HTTP client pools")
+        _ = self.session
+        _ = self.openai
+
+    async def close(self):
+        settings.LOGGER.info("Closing shared HTTP client pools")
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self._openai is not None:
+            await self._openai.close()
+        self._session = None
+        self._openai = None
+
+
+http_clients = HttpClients()
@@ -0,0 +1,37 @@
+import gzip
+import os
+import shutil
+from typing import Dict
+
+try:
+    import zstandard
+except ImportError:  # optional, only gzip variants are written without it
+    zstandard = None
+
+# content-coding -> file suffix, in order of preference
+ENCODING_SUFFIXES: Dict[str, str] = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def available_encodings() -> Dict[str, str]:
+    if zstandard is None:
+        return {"gzip": ENCODING_SUFFIXES["gzip"]}
+    return ENCODING_SUFFIXES
+
+
+def write_precompressed(file_path: str):
+    """
+    Write ``<file>.gz`` (and ``<file>.zst`` when zstandard is installed) next
+    to a result file so downloads can be served without compressing per request.
+    """
+    tmp_path = f"{file_path}.gz.tmp"
+    with open(file_path, "rb") as src, gzip.open(
+        tmp_path, "wb", compresslevel=9
+    ) as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, f"{file_path}.gz")
+
+    if zstandard is not None:
+        tmp_path = f"{file_path}.zst.tmp"
+        with open(file_path, "rb") as src, open(tmp_path, "wb") as dst:
+            zstandard.ZstdCompressor(level=19).copy_stream(src, dst)
+        os.replace(tmp_path, f"{file_path}.zst")
@@ -1,5 +1,22 @@
 from enum import Enum
 
+WEBHOOK_AUTH_HEADER = "X-Webhook-Secret"
+# AssemblyAI transcript ids; also used as marker file names, so nothing else
+TRANSCRIPT_ID_PATTERN = r"^[A-Za-z0-9-]+$"
+
+
+# values used by the AssemblyAI API; kept here so workers don't import the SDK
+class TranscriptStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    ERROR = "error"
+
+
+class SpeechModel(str, Enum):
+    BEST = "best"
+    NANO = "nano"
+
 
 class KnowledgePattern(str, Enum):
     IDEA_COMPASS = "idea_compass"
@@ -13,3 +30,26 @@ class Department(str, Enum):
     SERENDIPITY = "serendipity"
     TRADEMAN = "trademan"
     DHOOM_STUDIOS = "dhoom studios"
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class UploadState(str, Enum):
+    OPEN = "open"
+    FINALIZING = "finalizing"
+    FINALIZED = "finalized"
+
+
+class JobStage(str, Enum):
+    SAVED = "saved"
+    PREPROCESSED = "preprocessed"
+    UPLOADED = "uploaded"
+    SUBMITTED = "submitted"
+    TRANSCRIBED = "transcribed"
+    PATTERN = "pattern"  # one checkpoint per finished pattern
+    WRITTEN = "written"
@@ -0,0 +1,775 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from server import settings
+from server.settings import TRACE_ID
+
+from .constants import JobStage, JobState
+from .metrics import JOBS, QUEUE_WAIT_SECONDS
+from .scheduler import FairScheduler
+
+
+class PermanentJobError(Exception):
+    """
+    Raised by a job handler when retrying cannot help; the job fails at once.
+    """
+
+
+@dataclass
+class Job:
+    id: str
+    payload: dict
+    state: JobState
+    stage: Optional[JobStage]
+    checkpoint: dict
+    attempts: int
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            payload=json.loads(row["payload"]),
+            state=JobState(row["state"]),
+            stage=JobStage(row["stage"]) if row["stage"] else None,
+            checkpoint=json.loads(row["checkpoint"]),
+            attempts=row["attempts"],
+            error=row["error"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "state": self.state.value,
+            "stage": self.stage.value if self.stage else None,
+            "attempts": self.attempts,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+@dataclass
+class JobStore:
+    """
+    Jobs and their stage checkpoints, persisted in SQLite so every worker
+    process sees the same queue and in-flight work survives restarts.
+
+    A running job holds a lease; if its worker dies the lease expires and any
+    worker may claim the job again and resume from the last checkpoint.
+    """
+
+    db_path: str
+    scheduler: FairScheduler = field(default_factory=FairScheduler)
+    _schema_ready: bool = field(default=False, init=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            # once per process: every claim, poll and event opens a connection
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+            self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                stage TEXT,
+                checkpoint TEXT NOT NULL DEFAULT '{}',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                lease_owner TEXT,
+                lease_expires REAL,
+                retry_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                department TEXT NOT NULL DEFAULT '',
+                audio_size INTEGER NOT NULL DEFAULT 0,
+                first_claimed_at REAL
+            )
+            """)
+        self._add_columns(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_department ON jobs (state, department)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)"
+        )
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                batch_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                job_id TEXT NOT NULL,
+                PRIMARY KEY (batch_id, position)
+            )
+            """)
+        self.scheduler.create_tables(conn)
+
+    @staticmethod
+    def _add_columns(conn: sqlite3.Connection):
+        # databases created before fair scheduling lack these columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, definition in (
+            ("department", "TEXT NOT NULL DEFAULT ''"),
+            ("audio_size", "INTEGER NOT NULL DEFAULT 0"),
+            ("first_claimed_at", "REAL"),
+        ):
+            if column not in columns:
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError:
+                    pass  # added by another worker in the meantime
+
+    def _create_sync(
+        self,
+        payload: dict,
+        stage: JobStage,
+        checkpoint: dict,
+        hold_until: Optional[float],
+    ) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO jobs (id, payload, state, stage, checkpoint, retry_at, "
+                "created_at, updated_at, department, audio_size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    json.dumps(payload),
+                    JobState.QUEUED.value,
+                    stage.value,
+                    json.dumps(checkpoint),
+                    hold_until,
+                    now,
+                    now,
+                    payload.get("department") or "",
+                    payload.get("audio_size") or 0,
+                ),
+            )
+        finally:
+            conn.close()
+        return job_id
+
+    def _claim_sync(self, owner: str) -> Optional[Job]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # jobs of dead workers were already scheduled once, resume them first
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? AND lease_expires < ? "
+                "ORDER BY created_at LIMIT 1",
+                (JobState.RUNNING.value, now),
+            ).fetchone()
+            if row is None:
+                row = self.scheduler.next_job(conn, now)
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, updated_at = ?, "
+                "first_claimed_at = COALESCE(first_claimed_at, ?) WHERE id = ?",
+                (
+                    JobState.RUNNING.value,
+                    owner,
+                    now + settings.JOB_LEASE_SECONDS,
+                    now,
+                    now,
+                    row["id"],
+                ),
+            )
+            if row["first_claimed_at"] is None:
+                QUEUE_WAIT_SECONDS.labels(row["department"]).observe(
+                    now - row["created_at"]
+                )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (row["id"],)
+            ).fetchone()
+            conn.execute("COMMIT")
+            return Job.from_row(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _checkpoint_sync(self, job_id: str, stage: JobStage, updates: dict):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT checkpoint FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            checkpoint = json.loads(row["checkpoint"])
+            for key, value in updates.items():
+                # nested dicts (e.g. per-pattern results) are merged, not replaced
+                if isinstance(value, dict) and isinstance(checkpoint.get(key), dict):
+                    checkpoint[key].update(value)
+                else:
+                    checkpoint[key] = value
+            conn.execute(
+                "UPDATE jobs SET stage = ?, checkpoint = ?, updated_at = ? WHERE id = ?",
+                (stage.value, json.dumps(checkpoint), time.time(), job_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _release_hold_sync(
+        self, job_id: str, stage: Optional[JobStage], updates: dict
+    ) -> bool:
+        """
+        Make a held job claimable now, merging ``updates`` into its checkpoint.
+        Returns False if the hold already expired and a worker claimed it.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT stage, checkpoint FROM jobs "
+                "WHERE id = ? AND state = ? AND attempts = 0",
+                (job_id, JobState.QUEUED.value),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return False
+            checkpoint = {**json.loads(row["checkpoint"]), **updates}
+            conn.execute(
+                "UPDATE jobs SET stage = ?, checkpoint = ?, retry_at = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (
+                    stage.value if stage else row["stage"],
+                    json.dumps(checkpoint),
+                    time.time(),
+                    job_id,
+                ),
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _set_state_sync(
+        self,
+        job_id: str,
+        state: JobState,
+        error: Optional[str],
+        retry_at: Optional[float],
+    ):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, retry_at = ?, lease_owner = NULL, "
+                "lease_expires = NULL, updated_at = ? WHERE id = ?",
+                (state.value, error, retry_at, time.time(), job_id),
+            )
+        finally:
+            conn.close()
+
+    def _heartbeat_sync(self, job_ids: List[str], owner: str):
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                [
+                    (time.time() + settings.JOB_LEASE_SECONDS, job_id, owner)
+                    for job_id in job_ids
+                ],
+            )
+        finally:
+            conn.close()
+
+    def _release_sync(self, owner: str):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts - 1, lease_owner = NULL, "
+                "lease_expires = NULL WHERE state = ? AND lease_owner = ?",
+                (JobState.QUEUED.value, JobState.RUNNING.value, owner),
+            )
+        finally:
+            conn.close()
+
+    def _get_sync(self, job_id: str) -> Optional[Job]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return Job.from_row(row) if row else None
+
+    def _add_to_batch_sync(self, batch_id: str, position: int, job_id: str):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO batch_jobs (batch_id, position, job_id) VALUES (?, ?, ?)",
+                (batch_id, position, job_id),
+            )
+        finally:
+            conn.close()
+
+    def _batch_jobs_sync(self, batch_id: str) -> List[Job]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT jobs.* FROM batch_jobs JOIN jobs ON jobs.id = batch_jobs.job_id "
+                "WHERE batch_jobs.batch_id = ? ORDER BY batch_jobs.position",
+                (batch_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [Job.from_row(row) for row in rows]
+
+    def active_save_dirs_sync(self) -> Set[str]:
+        """
+        Directories still needed by queued or running jobs (used by retention).
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT payload FROM jobs WHERE state IN (?, ?)",
+                (JobState.QUEUED.value, JobState.RUNNING.value),
+            ).fetchall()
+        finally:
+            conn.close()
+        return {json.loads(row["payload"]).get("save_dir") for row in rows} - {None}
+
+    def prune_sync(self, max_age: float) -> int:
+        """
+        Delete completed and failed jobs not updated for ``max_age`` seconds,
+        with their batch entries (used by retention). Returns the jobs deleted.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?",
+                (
+                    JobState.COMPLETED.value,
+                    JobState.FAILED.value,
+                    time.time() - max_age,
+                ),
+            ).rowcount
+            if deleted:
+                conn.execute(
+                    "DELETE FROM batch_jobs WHERE job_id NOT IN (SELECT id FROM jobs)"
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return deleted
+
+    def prune_events_sync(self, max_age: float) -> int:
+        """
+        Delete the events of jobs finished more than ``max_age`` seconds ago,
+        except the final state event that ends their SSE stream, and the
+        events of deleted jobs (used by retention). Returns the events deleted.
+        """
+        finished = "SELECT id FROM jobs WHERE state IN (?, ?) AND updated_at < ?"
+        params = (
+            JobState.COMPLETED.value,
+            JobState.FAILED.value,
+            time.time() - max_age,
+        )
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = conn.execute(
+                f"DELETE FROM job_events WHERE job_id IN ({finished}) AND id NOT IN ("
+                f"SELECT MAX(id) FROM job_events WHERE type = 'state' "
+                f"AND job_id IN ({finished}) GROUP BY job_id)",
+                params + params,
+            ).rowcount
+            deleted += conn.execute(
+                "DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)"
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return deleted
+
+    def _scheduler_stats_sync(self) -> Dict[str, dict]:
+        conn = self._connect()
+        try:
+            return self.scheduler.stats(conn)
+        finally:
+            conn.close()
+
+    def _add_event_sync(self, job_id: str, event_type: str, data: dict):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO job_events (job_id, type, data, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (job_id, event_type, json.dumps(data), time.time()),
+            )
+        finally:
+            conn.close()
+
+    def _events_after_sync(self, job_id: str, last_event_id: int) -> List[dict]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, type, data FROM job_events WHERE job_id = ? AND id > ? "
+                "ORDER BY id",
+                (job_id, last_event_id),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": row["id"], "type": row["type"], "data": json.loads(row["data"])}
+            for row in rows
+        ]
+
+    async def create(
+        self,
+        payload: dict,
+        stage: JobStage,
+        checkpoint: Optional[dict] = None,
+        hold_until: Optional[float] = None,
+    ) -> str:
+        return await asyncio.to_thread(
+            self._create_sync, payload, stage, checkpoint or {}, hold_until
+        )
+
+    async def claim(self, owner: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._claim_sync, owner)
+
+    async def checkpoint(self, job_id: str, stage: JobStage, **updates):
+        await asyncio.to_thread(self._checkpoint_sync, job_id, stage, updates)
+
+    async def release_hold(
+        self, job_id: str, stage: Optional[JobStage] = None, **updates
+    ) -> bool:
+        return await asyncio.to_thread(self._release_hold_sync, job_id, stage, updates)
+
+    async def set_state(
+        self,
+        job_id: str,
+        state: JobState,
+        error: Optional[str] = None,
+        retry_at: Optional[float] = None,
+    ):
+        await asyncio.to_thread(self._set_state_sync, job_id, state, error, retry_at)
+
+    async def heartbeat(self, job_ids: List[str], owner: str):
+        await asyncio.to_thread(self._heartbeat_sync, job_ids, owner)
+
+    async def release(self, owner: str):
+        await asyncio.to_thread(self._release_sync, owner)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return await asyncio.to_thread(self._get_sync, job_id)
+
+    async def add_to_batch(self, batch_id: str, position: int, job_id: str):
+        await asyncio.to_thread(self._add_to_batch_sync, batch_id, position, job_id)
+
+    async def batch_jobs(self, batch_id: str) -> List[Job]:
+        return await asyncio.to_thread(self._batch_jobs_sync, batch_id)
+
+    async def add_event(self, job_id: str, event_type: str, data: dict):
+        await asyncio.to_thread(self._add_event_sync, job_id, event_type, data)
+
+    async def events_after(self, job_id: str, last_event_id: int) -> List[dict]:
+        return await asyncio.to_thread(self._events_after_sync, job_id, last_event_id)
+
+    async def scheduler_stats(self) -> Dict[str, dict]:
+        return await asyncio.to_thread(self._scheduler_stats_sync)
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+# tries to record a job's outcome before leaving it to the lease
+STATE_WRITE_ATTEMPTS = 3
+
+
+@dataclass
+class JobQueue:
+    """
+    Per-process pool of JOB_WORKERS_PER_PROCESS workers pulling from the shared
+    JobStore. Jobs enqueued in this process wake the pool immediately; jobs
+    from other processes, retries and expired leases (e.g. after a restart)
+    are picked up on the next poll.
+    """
+
+    store: JobStore
+    owner: str = field(
+        default_factory=lambda: f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    )
+    _handler: Optional[JobHandler] = field(default=None, init=False)
+    _workers: List[asyncio.Task] = field(default_factory=list, init=False)
+    _running: dict = field(default_factory=dict, init=False)
+    _wakeup: Optional[asyncio.Event] = field(default=None, init=False)
+    _listeners: Dict[str, Set[asyncio.Event]] = field(
+        default_factory=lambda: defaultdict(set), init=False
+    )
+    _holds: Set[asyncio.Task] = field(default_factory=set, init=False)
+
+    async def enqueue(
+        self,
+        payload: dict,
+        stage: JobStage,
+        checkpoint: Optional[dict] = None,
+        hold_until: Optional[float] = None,
+    ) -> str:
+        job_id = await self.store.create(payload, stage, checkpoint, hold_until)
+        await self.publish(job_id, "state", state=JobState.QUEUED.value)
+        await self.publish(job_id, "stage", stage=stage.value)
+        if self._wakeup is not None and hold_until is None:
+            self._wakeup.set()
+        return job_id
+
+    async def enqueue_when_ready(
+        self,
+        payload: dict,
+        stage: JobStage,
+        ready: Awaitable[Optional[dict]],
+        ready_stage: JobStage,
+        hold_seconds: float,
+    ) -> str:
+        """
+        Queue a job now but keep workers off it until ``ready`` resolves, so
+        work still running in this process (e.g. a tee'd upload) can hand its
+        result to the job without delaying the caller. A non-empty result is
+        merged into the checkpoint at ``ready_stage``. The hold expires after
+        ``hold_seconds`` in case this process dies first.
+        """
+        job_id = await self.enqueue(
+            payload, stage, hold_until=time.time() + hold_seconds
+        )
+        task = asyncio.create_task(self._release_when_ready(job_id, ready, ready_stage))
+        self._holds.add(task)
+        task.add_done_callback(self._holds.discard)
+        return job_id
+
+    async def _release_when_ready(
+        self, job_id: str, ready: Awaitable[Optional[dict]], ready_stage: JobStage
+    ):
+        try:
+            updates = await ready
+        except Exception as e:
+            settings.LOGGER.error(f"Preparing job {job_id} failed: {str(e)}")
+            updates = None
+        stage = ready_stage if updates else None
+        try:
+            released = await self.store.release_hold(job_id, stage, **(updates or {}))
+        except sqlite3.Error as e:
+            settings.LOGGER.error(f"Failed to release job {job_id}: {str(e)}")
+            return
+        if released and stage:
+            await self.publish(job_id, "stage", stage=stage.value)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def publish(self, job_id: str, event_type: str, **data):
+        """
+        Record a job event. Listeners in this process are woken immediately;
+        listeners in other workers see it on their next poll.
+        """
+        try:
+            await self.store.add_event(job_id, event_type, data)
+        except sqlite3.Error as e:
+            settings.LOGGER.error(f"Failed to record {event_type} for {job_id}: {e}")
+            return
+        for listener in self._listeners.get(job_id, ()):
+            listener.set()
+
+    async def events(self, job_id: str, last_event_id: int = 0) -> AsyncIterator[dict]:
+        """
+        Yield the job's events after ``last_event_id`` until it completes or
+        fails, then stop. Yields None as a keep-alive when nothing happened.
+        """
+        listener = asyncio.Event()
+        self._listeners[job_id].add(listener)
+        try:
+            idle = 0.0
+            while True:
+                events = await self.store.events_after(job_id, last_event_id)
+                for event in events:
+                    last_event_id = event["id"]
+                    yield event
+                    if event["type"] == "state" and event["data"]["state"] in (
+                        JobState.COMPLETED.value,
+                        JobState.FAILED.value,
+                    ):
+                        return
+
+                if events:
+                    idle = 0.0
+                elif idle >= settings.JOB_EVENTS_KEEPALIVE:
+                    idle = 0.0
+                    yield None
+
+                try:
+                    await asyncio.wait_for(
+                        listener.wait(), timeout=settings.JOB_EVENTS_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    idle += settings.JOB_EVENTS_POLL_INTERVAL
+                listener.clear()
+        finally:
+            self._listeners[job_id].discard(listener)
+            if not self._listeners[job_id]:
+                self._listeners.pop(job_id, None)
+
+    def has_listeners(self, job_id: str) -> bool:
+        """
+        Whether an SSE client in this process is following the job.
+        """
+        return bool(self._listeners.get(job_id))
+
+    def start(self, handler: JobHandler):
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(settings.JOB_WORKERS_PER_PROCESS)
+        ]
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+        settings.LOGGER.info(
+            f"Job queue {self.owner} started with "
+            f"{settings.JOB_WORKERS_PER_PROCESS} workers"
+        )
+
+    async def stop(self):
+        for task in [*self._workers, *self._holds]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._holds, return_exceptions=True)
+        self._workers = []
+        # hand unfinished jobs back so another worker resumes them right away
+        await self.store.release(self.owner)
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.store.claim(self.owner)
+            except sqlite3.Error as e:
+                # e.g. "database is locked" under load: back off, keep the worker
+                settings.LOGGER.error(f"Job claim failed: {str(e)}")
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+                continue
+            if job is None:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Job):
+        # log lines of this job carry the id of the request that submitted it
+        TRACE_ID.set(job.payload.get("trace_id") or job.id)
+        settings.LOGGER.info(
+            f"Running job {job.id} (attempt {job.attempts}, stage {job.stage})"
+        )
+        self._running[job.id] = job
+        await self.publish(job.id, "state", state=JobState.RUNNING.value)
+        try:
+            await self._handler(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            settings.LOGGER.error(f"Job {job.id} failed: {str(e)}")
+            state = JobState.FAILED
+            retry_at = None
+            if job.attempts < settings.JOB_MAX_ATTEMPTS and not isinstance(
+                e, PermanentJobError
+            ):
+                state = JobState.QUEUED
+                retry_at = time.time() + settings.JOB_RETRY_DELAY * job.attempts
+            if await self._set_state(job.id, state, str(e), retry_at):
+                await self.publish(job.id, "state", state=state.value, error=str(e))
+                JOBS.labels("retried" if retry_at else state.value).inc()
+        else:
+            if await self._set_state(job.id, JobState.COMPLETED):
+                await self.publish(job.id, "state", state=JobState.COMPLETED.value)
+                JOBS.labels(JobState.COMPLETED.value).inc()
+        finally:
+            self._running.pop(job.id, None)
+            # the department may have been at its in-flight cap
+            self._wakeup.set()
+
+    async def _set_state(
+        self,
+        job_id: str,
+        state: JobState,
+        error: Optional[str] = None,
+        retry_at: Optional[float] = None,
+    ) -> bool:
+        """
+        Record the outcome of a job, retrying while the database is busy. If
+        that keeps failing the job is left RUNNING; its heartbeat stops, so
+        the lease expires and a worker resumes it from its last checkpoint.
+        """
+        for attempt in range(1, STATE_WRITE_ATTEMPTS + 1):
+            try:
+                await self.store.set_state(job_id, state, error, retry_at=retry_at)
+                return True
+            except sqlite3.Error as e:
+                settings.LOGGER.error(
+                    f"Failed to mark job {job_id} {state.value} "
+                    f"(attempt {attempt}): {str(e)}"
+                )
+                if attempt < STATE_WRITE_ATTEMPTS:
+                    await asyncio.sleep(settings.JOB_POLL_INTERVAL * attempt)
+        return False
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            if self._running:
+                try:
+                    await self.store.heartbeat(list(self._running), self.owner)
+                except sqlite3.Error as e:
+                    settings.LOGGER.error(f"Job heartbeat failed: {str(e)}")
+
+
+job_queue = JobQueue(store=JobStore(db_path=os.path.join(settings.DATA_DIR, "jobs.db")))
@@ -0,0 +1,125 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from server import settings
+
+# must be set before prometheus_client is imported; gunicorn.conf.py sets it for
+# every worker and clears the directory when the master starts
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.METRICS_DIR)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# from sub-second calls up to hour-long transcriptions
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "meeting_stage_seconds",
+    "Time spent in each pipeline stage of a meeting",
+    ["stage"],
+    buckets=DURATION_BUCKETS,
+)
+STAGE_IN_FLIGHT = Gauge(
+    "meeting_stage_in_flight",
+    "Meetings currently in each pipeline stage",
+    ["stage"],
+    multiprocess_mode="livesum",
+)
+PATTERN_SECONDS = Histogram(
+    "pattern_seconds",
+    "Time to produce one pattern's output (including map-reduce)",
+    ["pattern"],
+    buckets=DURATION_BUCKETS,
+)
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "provider_request_seconds",
+    "Latency of single AssemblyAI and OpenAI requests",
+    ["provider", "operation"],
+    buckets=DURATION_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "Tokens reported by OpenAI",
+    ["pattern", "model", "type"],
+)
+UPLOAD_BYTES = Counter("upload_bytes_total", "Audio bytes uploaded to AssemblyAI")
+JOBS = Counter("jobs_total", "Finished meeting jobs", ["state"])
+STAGE_WAITING = Gauge(
+    "meeting_stage_waiting",
+    "Claimed meetings waiting for a slot of a pipeline stage",
+    ["stage", "department"],
+    multiprocess_mode="livesum",
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Transcript and response cache lookups",
+    ["cache", "result"],
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "job_queue_wait_seconds",
+    "Time from submission until a worker first claimed the job",
+    ["department"],
+    buckets=DURATION_BUCKETS,
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """
+    Time a pipeline stage and count it as in flight while it runs.
+    """
+    started = time.monotonic()
+    STAGE_IN_FLIGHT.labels(stage).inc()
+    try:
+        yield
+    finally:
+        STAGE_IN_FLIGHT.labels(stage).dec()
+        STAGE_SECONDS.labels(stage).observe(time.monotonic() - started)
+
+
+@contextmanager
+def track_request(provider: str, operation: str) -> Iterator[None]:
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        PROVIDER_REQUEST_SECONDS.labels(provider, operation).observe(
+            time.monotonic() - started
+        )
+
+
+def _collect() -> CollectorRegistry:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> tuple:
+    """
+    Return (body, content type) with the metrics of all worker processes.
+    """
+    return generate_latest(_collect()), CONTENT_TYPE_LATEST
+
+
+def counter_totals(name: str, *labels: str) -> Dict[Tuple[str, ...], float]:
+    """
+    Values of the counter ``name`` summed over all worker processes, keyed by
+    the values of ``labels``.
+    """
+    totals = {}
+    for family in _collect().collect():
+        for sample in family.samples:
+            if sample.name == f"{name}_total":
+                key = tuple(sample.labels[label] for label in labels)
+                totals[key] = totals.get(key, 0.0) + sample.value
+    return totals
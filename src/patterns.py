@@ -0,0 +1,104 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from server import settings
+
+from .constants import KnowledgePattern
+from .tokens import count_tokens
+
+
+@dataclass
+class PatternPrompt:
+    pattern: KnowledgePattern
+    path: str
+    prompt: str
+    tokens: int
+    mtime: float
+
+
+@dataclass
+class PatternRegistry:
+    """
+    In-memory prompts for every KnowledgePattern, loaded once at startup and
+    reloaded when a pattern file's mtime changes.
+    """
+
+    directory: str
+    _prompts: Dict[str, PatternPrompt] = field(default_factory=dict, init=False)
+    _task: Optional[asyncio.Task] = field(default=None, init=False)
+
+    def _path(self, pattern: KnowledgePattern) -> str:
+        return os.path.join(self.directory, f"create_{pattern.value}.md")
+
+    def _read(self, pattern: KnowledgePattern) -> PatternPrompt:
+        path = self._path(pattern)
+        mtime = os.stat(path).st_mtime
+        with open(path, "r") as file:
+            prompt = file.read()
+        if not prompt.strip():
+            raise ValueError(f"Pattern file {path} is empty")
+        return PatternPrompt(
+            pattern=pattern,
+            path=path,
+            prompt=prompt,
+            tokens=count_tokens(prompt),
+            mtime=mtime,
+        )
+
+    def load(self):
+        """
+        Load and validate every pattern. Raises if any pattern is missing so
+        the app fails at boot instead of mid-job.
+        """
+        prompts, errors = {}, []
+        for pattern in KnowledgePattern:
+            try:
+                prompts[pattern.value] = self._read(pattern)
+            except (OSError, ValueError) as e:
+                errors.append(f"{pattern.value}: {str(e)}")
+        if errors:
+            raise RuntimeError(f"Invalid knowledge patterns: {'; '.join(errors)}")
+
+        self._prompts = prompts
+        settings.LOGGER.info(f"Loaded {len(prompts)} knowledge patterns")
+
+    def reload_changed(self):
+        for key, current in list(self._prompts.items()):
+            try:
+                if os.stat(current.path).st_mtime == current.mtime:
+                    continue
+                self._prompts[key] = self._read(current.pattern)
+                settings.LOGGER.info(f"Reloaded pattern {key}")
+            except (OSError, ValueError) as e:
+                # keep serving the last good version
+                settings.LOGGER.error(f"Failed to reload pattern {key}: {str(e)}")
+
+    def get(self, pattern: str) -> PatternPrompt:
+        if not self._prompts:
+            self.load()
+        return self._prompts[pattern]
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(settings.PATTERN_RELOAD_INTERVAL)
+            await asyncio.to_thread(self.reload_changed)
+
+    def start(self):
+        if not self._prompts:
+            self.load()
+        if settings.PATTERN_RELOAD_INTERVAL > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+pattern_registry = PatternRegistry(directory=settings.PATTERNS_DIR)
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+
+from server import settings
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class RateLimiter:
+    """
+    Token buckets (per-minute budgets) shared by every worker process through a
+    SQLite file. Each acquire reserves its cost immediately, possibly driving
+    the bucket negative, and sleeps until the debt is paid back; this keeps
+    callers roughly FIFO without a central service.
+    """
+
+    db_path: str
+    _schema_ready: bool = field(default=False, init=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+            self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _reserve_sync(self, bucket: str, per_minute: float, cost: float) -> float:
+        rate = per_minute / 60
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (bucket,)
+            ).fetchone()
+            now = time.time()
+            tokens = per_minute
+            if row is not None:
+                tokens = min(per_minute, row[0] + (now - row[1]) * rate)
+            tokens = min(tokens - cost, per_minute)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)",
+                (bucket, tokens, now),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return max(-tokens / rate, 0)
+
+    async def acquire(self, bucket: str, per_minute: float, cost: float = 1):
+        """
+        Wait until ``cost`` units of ``bucket`` are available (at most the whole
+        budget). A budget of 0 disables the bucket.
+        """
+        if per_minute <= 0 or cost == 0:
+            return
+        # a call larger than the whole budget waits for a full bucket instead
+        # of overdrawing it for minutes
+        cost = min(cost, per_minute)
+        wait = await asyncio.to_thread(self._reserve_sync, bucket, per_minute, cost)
+        if wait > 0:
+            settings.LOGGER.info(f"Rate limit {bucket}: waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    async def adjust(self, bucket: str, per_minute: float, delta: float):
+        """
+        Correct a reservation once the real cost is known (e.g. token usage).
+        """
+        if per_minute <= 0 or delta == 0:
+            return
+        await asyncio.to_thread(self._reserve_sync, bucket, per_minute, delta)
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = (headers or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(error: Exception) -> Optional[float]:
+    """
+    Return the server-requested delay (or 0 for "use backoff") if the error is
+    retryable, None if it is not.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        if error.status not in RETRYABLE_STATUS:
+            return None
+        return _retry_after(error.headers) or 0
+    # openai is imported lazily; until it is loaded no error can be one of its own
+    openai = sys.modules.get("openai")
+    if openai is not None:
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+            return _retry_after(error.response.headers) or 0
+        if isinstance(error, openai.APIConnectionError):
+            return 0
+    if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+        return 0
+    return None
+
+
+async def with_retries(call: Callable[[], Awaitable[T]], *, description: str) -> T:
+    """
+    Run ``call`` with jittered exponential backoff on 429/5xx and connection
+    errors, honouring Retry-After when the provider sends it.
+    """
+    for attempt in range(settings.RETRY_MAX_ATTEMPTS):
+        try:
+            return await call()
+        except Exception as e:
+            requested = _retry_delay(e)
+            if requested is None or attempt == settings.RETRY_MAX_ATTEMPTS - 1:
+                raise
+            backoff = min(
+                settings.RETRY_BASE_DELAY * 2**attempt, settings.RETRY_MAX_DELAY
+            )
+            delay = max(requested, random.uniform(0, backoff))
+            settings.LOGGER.warning(
+                f"{description} failed ({str(e)}), retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+
+rate_limiter = RateLimiter(db_path=os.path.join(settings.DATA_DIR, "ratelimit.db"))
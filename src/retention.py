@@ -0,0 +1,223 @@
+import asyncio
+import fcntl
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from server import settings
+
+from .catalog import meeting_catalog
+from .jobs import job_queue
+from .transcript_waiter import transcript_waiter
+from .uploads import upload_store
+
+# files that are produced by the pipeline; everything else in a meeting dir is audio
+RESULT_PREFIXES = ("combined_results", "transcript.")
+ACCESS_MARKER = ".last_access"
+
+
+@dataclass
+class _MeetingDir:
+    path: str
+    last_used: float
+    audio: List[Tuple[str, int]]
+    results: List[Tuple[str, int]]
+
+    @property
+    def audio_bytes(self) -> int:
+        return sum(size for _, size in self.audio)
+
+    @property
+    def size(self) -> int:
+        return self.audio_bytes + sum(size for _, size in self.results)
+
+
+@dataclass
+class RetentionSweeper:
+    """
+    Periodically frees space under ``UPLOAD_DIR`` (``department/date`` meeting
+    directories).
+
+    Raw audio is dropped ``FILE_DELETE_TIME`` seconds after a meeting was last
+    touched, whole meetings after ``RESULT_RETENTION_SECONDS``. If the directory
+    is still above ``UPLOAD_DIR_MAX_BYTES`` the least recently used meetings
+    lose their audio first, then their results. Meetings of queued or running
+    jobs are never touched. Resumable upload sessions idle for longer than
+    ``UPLOAD_SESSION_TTL`` and webhook markers older than
+    ``WEBHOOK_MARKER_TTL`` are dropped as well. Every worker runs the loop but
+    a file lock lets only one of them sweep at a time.
+    """
+
+    root: str
+    lock_path: str
+    _task: Optional[asyncio.Task] = field(default=None, init=False)
+
+    async def touch(self, meeting_dir: str):
+        """
+        Record a download so quota eviction treats the meeting as recently used.
+        """
+        await asyncio.to_thread(self._touch_sync, meeting_dir)
+
+    @staticmethod
+    def _touch_sync(meeting_dir: str):
+        marker = os.path.join(meeting_dir, ACCESS_MARKER)
+        try:
+            with open(marker, "a"):
+                os.utime(marker)
+        except OSError:
+            pass
+
+    def _scan(self) -> List[_MeetingDir]:
+        meetings = []
+        if not os.path.isdir(self.root):
+            return meetings
+
+        for department in os.scandir(self.root):
+            if not department.is_dir():
+                continue
+            for meeting in os.scandir(department.path):
+                if not meeting.is_dir():
+                    continue
+                audio, results, last_used = [], [], meeting.stat().st_mtime
+                for entry in os.scandir(meeting.path):
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    last_used = max(last_used, stat.st_mtime)
+                    if entry.name == ACCESS_MARKER:
+                        continue
+                    if entry.name.startswith(RESULT_PREFIXES):
+                        results.append((entry.path, stat.st_size))
+                    else:
+                        audio.append((entry.path, stat.st_size))
+                meetings.append(_MeetingDir(meeting.path, last_used, audio, results))
+        return meetings
+
+    def usage_sync(self) -> int:
+        """
+        Bytes used by the meeting directories under ``UPLOAD_DIR``.
+        """
+        return sum(meeting.size for meeting in self._scan())
+
+    @staticmethod
+    def _remove_audio(meeting: _MeetingDir) -> int:
+        freed = 0
+        for path, size in meeting.audio:
+            try:
+                os.remove(path)
+                freed += size
+            except FileNotFoundError:
+                pass
+        meeting.audio = []
+        return freed
+
+    @staticmethod
+    def _remove_meeting(meeting: _MeetingDir) -> int:
+        freed = meeting.size
+        meeting_catalog.remove_sync(meeting.path)
+        shutil.rmtree(meeting.path, ignore_errors=True)
+        return freed
+
+    def _sweep_locked(self) -> Tuple[int, int]:
+        if settings.UPLOAD_SESSION_TTL:
+            expired = upload_store.expire_sync(settings.UPLOAD_SESSION_TTL)
+            if expired:
+                settings.LOGGER.info(f"Expired {expired} idle upload sessions")
+        if settings.WEBHOOK_MARKER_TTL:
+            transcript_waiter.expire_markers_sync(settings.WEBHOOK_MARKER_TTL)
+        if settings.JOB_RETENTION_SECONDS:
+            pruned = job_queue.store.prune_sync(settings.JOB_RETENTION_SECONDS)
+            if pruned:
+                settings.LOGGER.info(f"Pruned {pruned} finished jobs")
+        if settings.JOB_EVENTS_RETENTION_SECONDS:
+            job_queue.store.prune_events_sync(settings.JOB_EVENTS_RETENTION_SECONDS)
+
+        now = time.time()
+        meetings = self._scan()
+        total = sum(meeting.size for meeting in meetings)
+
+        active = job_queue.store.active_save_dirs_sync()
+        candidates = sorted(
+            (meeting for meeting in meetings if meeting.path not in active),
+            key=lambda meeting: meeting.last_used,
+        )
+
+        freed, removed = 0, 0
+        kept = []
+        for meeting in candidates:
+            age = now - meeting.last_used
+            if settings.RESULT_RETENTION_SECONDS and (
+                age > settings.RESULT_RETENTION_SECONDS
+            ):
+                freed += self._remove_meeting(meeting)
+                removed += 1
+                continue
+            if meeting.audio and age > settings.FILE_DELETE_TIME:
+                freed += self._remove_audio(meeting)
+            kept.append(meeting)
+
+        # quota: least recently used first, audio before results
+        quota = settings.UPLOAD_DIR_MAX_BYTES
+        if quota:
+            for meeting in kept:
+                if total - freed <= quota:
+                    break
+                freed += self._remove_audio(meeting)
+            for meeting in kept:
+                if total - freed <= quota:
+                    break
+                freed += self._remove_meeting(meeting)
+                removed += 1
+            if total - freed > quota:
+                settings.LOGGER.warning(
+                    f"Uploads use {total - freed} bytes, above the {quota} byte "
+                    f"quota, but the rest belongs to active jobs"
+                )
+        return freed, removed
+
+    def sweep_sync(self) -> Optional[Tuple[int, int]]:
+        """
+        Run one sweep. Returns (bytes freed, meetings removed), or None when
+        another worker holds the lock.
+        """
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            return self._sweep_locked()
+
+    async def _run(self):
+        while True:
+            try:
+                result = await asyncio.to_thread(self.sweep_sync)
+                if result and result[0]:
+                    settings.LOGGER.info(
+                        f"Retention freed {result[0]} bytes, "
+                        f"removed {result[1]} meetings"
+                    )
+            except Exception as e:
+                settings.LOGGER.error(f"Retention sweep failed: {str(e)}")
+            await asyncio.sleep(settings.RETENTION_SWEEP_INTERVAL)
+
+    def start(self):
+        if settings.RETENTION_SWEEP_INTERVAL > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+retention_sweeper = RetentionSweeper(
+    root=settings.UPLOAD_DIR,
+    lock_path=os.path.join(settings.DATA_DIR, "retention.lock"),
+)
@@ -1,11 +1,25 @@
-from typing import List
+import asyncio
+import hmac
+from typing import List, Literal, Optional
 
-from fastapi import File, UploadFile
+from fastapi import File, Header, HTTPException, Request, UploadFile
 
-from server import APIRouter
+from server import APIRouter, settings
 
-from .constants import Department, KnowledgePattern
-from .views import FetchWisdomFile, MeetingProcessor
+from .agents_schema import TranscriptWebhook
+from .cache import response_cache, transcript_cache
+from .constants import WEBHOOK_AUTH_HEADER, Department, KnowledgePattern
+from .jobs import job_queue
+from .transcript_waiter import transcript_waiter
+from .views import (
+    BatchProcessor,
+    FetchWisdomFile,
+    JobStatus,
+    MeetingProcessor,
+    MeetingSearch,
+    ResumableUpload,
+    TranscriptWords,
+)
 
 meeting_router = APIRouter(prefix="/meeting", tags=["meeting"])
 
@@ -31,6 +45,156 @@ async def transcribe_meeting(
     ).build_knowledge_base()
 
 
+@meeting_router.post("/submit-batch")
+async def transcribe_meeting_batch(
+    language: str,
+    meeting_subject: str,
+    knowledge_patterns: List[str],
+    department: Department,
+    audio_files: List[UploadFile] = File(...),
+):
+    knowledge_patterns = knowledge_patterns[0].split(",")
+    validated_patterns = [KnowledgePattern(pattern) for pattern in knowledge_patterns]
+
+    return await BatchProcessor(
+        language=language,
+        meeting_subject=meeting_subject,
+        knowledge_patterns=validated_patterns,
+        department=department,
+        audio_files=audio_files,
+    ).submit()
+
+
+@meeting_router.post("/uploads")
+async def create_upload(
+    language: str,
+    meeting_subject: str,
+    knowledge_patterns: str,
+    department: Department,
+    filename: str,
+    size: int,
+    sha256: Optional[str] = None,
+):
+    # no body here, so the patterns come as one comma separated query parameter
+    validated_patterns = [
+        KnowledgePattern(pattern) for pattern in knowledge_patterns.split(",")
+    ]
+
+    return await ResumableUpload().create(
+        language=language,
+        meeting_subject=meeting_subject,
+        knowledge_patterns=validated_patterns,
+        department=department,
+        filename=filename,
+        size=size,
+        sha256=sha256,
+    )
+
+
+@meeting_router.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    return await ResumableUpload().status(upload_id)
+
+
+@meeting_router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    chunk_sha256: Optional[str] = Header(default=None, alias="X-Chunk-SHA256"),
+):
+    return await ResumableUpload().put_chunk(
+        upload_id, offset, request.stream(), chunk_sha256
+    )
+
+
+@meeting_router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    return await ResumableUpload().finalize(upload_id)
+
+
+@meeting_router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    return await ResumableUpload().abort(upload_id)
+
+
+@meeting_router.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    return await BatchProcessor.status(batch_id)
+
+
 @meeting_router.get("/wisdom-file/{file_search_dir}")
-async def download_file(file_search_dir: str):
-    return await FetchWisdomFile().get(file_search_dir)
+async def download_file(file_search_dir: str, request: Request):
+    return await FetchWisdomFile().get(file_search_dir, request.headers)
+
+
+@meeting_router.get("/words/{file_search_dir}")
+async def transcript_words(
+    file_search_dir: str,
+    start_ms: int,
+    end_ms: int,
+    group: Literal["words", "utterances"] = "words",
+    limit: int = 1000,
+):
+    return await TranscriptWords().get(file_search_dir, start_ms, end_ms, group, limit)
+
+
+@meeting_router.get("/meetings")
+async def list_meetings(
+    department: Optional[Department] = None, limit: int = 20, offset: int = 0
+):
+    return await MeetingSearch().list(department, limit, offset)
+
+
+@meeting_router.get("/meetings/search")
+async def search_meetings(
+    q: str,
+    department: Optional[Department] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    return await MeetingSearch().search(q, department, limit, offset)
+
+
+@meeting_router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return await JobStatus().get(job_id)
+
+
+@meeting_router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    last_event_id: int = Header(default=0, alias="Last-Event-ID"),
+):
+    return await JobStatus().stream(job_id, last_event_id)
+
+
+@meeting_router.get("/cache-stats")
+async def cache_stats():
+    # aggregating the multiprocess counters reads one file per worker
+    return {
+        "transcripts": await asyncio.to_thread(transcript_cache.stats),
+        "responses": await asyncio.to_thread(response_cache.stats),
+    }
+
+
+@meeting_router.get("/scheduler-stats")
+async def scheduler_stats():
+    return {"departments": await job_queue.store.scheduler_stats()}
+
+
+@meeting_router.post("/assemblyai-webhook")
+async def assemblyai_webhook(
+    payload: TranscriptWebhook,
+    webhook_secret: Optional[str] = Header(default=None, alias=WEBHOOK_AUTH_HEADER),
+):
+    # without a secret no webhook_url is sent, so nothing legitimate calls this
+    if not settings.ASSEMBLYAI_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Webhook is not enabled")
+    if not webhook_secret or not hmac.compare_digest(
+        webhook_secret, settings.ASSEMBLYAI_WEBHOOK_SECRET
+    ):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+
+    await transcript_waiter.notify(payload.transcript_id)
+    return {"message": "ok"}
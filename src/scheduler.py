@@ -0,0 +1,160 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from server import settings
+
+from .constants import Department, JobState
+
+# row of scheduler_shares holding the virtual clock instead of a department
+CLOCK = "*"
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@dataclass
+class FairScheduler:
+    """
+    Picks the next queued job for ``JobStore.claim`` so departments share the
+    workers by weight instead of first come, first served.
+
+    Departments are chosen by start-time fair queuing: each one has a virtual
+    finish time that advances by ``1 / weight`` per claimed job, and the
+    backlogged department with the earliest start (its finish time, but never
+    earlier than the shared clock) goes next. A department that was idle
+    therefore rejoins at the current clock instead of cashing in the time it
+    was away. Departments at their ``DEPARTMENT_MAX_IN_FLIGHT`` are skipped.
+    Within a department the smallest audio goes first, with queued time
+    offsetting size so long recordings are not starved.
+
+    All state lives in the jobs database and is updated inside the claim
+    transaction, so the shares hold across every worker process. Workers
+    claim more jobs than their stages can run at once; the claimed jobs then
+    queue for stage slots in ``stages.FairSemaphore``, which applies the
+    same policy per process.
+    """
+
+    @staticmethod
+    def create_tables(conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_shares (
+                department TEXT PRIMARY KEY,
+                finish REAL NOT NULL
+            )
+            """)
+
+    @staticmethod
+    def weight(department: str) -> float:
+        weight = settings.DEPARTMENT_WEIGHTS.get(department, 1.0)
+        return weight if weight > 0 else 1.0
+
+    @staticmethod
+    def max_in_flight(department: str) -> int:
+        return settings.DEPARTMENT_MAX_IN_FLIGHT.get(department, 0)
+
+    def next_job(self, conn: sqlite3.Connection, now: float) -> Optional[sqlite3.Row]:
+        """
+        Return the queued job to claim next, or None. Must be called inside
+        the claim transaction.
+        """
+        backlog = [
+            row["department"]
+            for row in conn.execute(
+                "SELECT DISTINCT department FROM jobs "
+                "WHERE state = ? AND COALESCE(retry_at, 0) <= ?",
+                (JobState.QUEUED.value, now),
+            )
+        ]
+        if not backlog:
+            return None
+
+        running = {
+            row["department"]: row["running"]
+            for row in conn.execute(
+                "SELECT department, COUNT(*) AS running FROM jobs "
+                "WHERE state = ? AND lease_expires >= ? GROUP BY department",
+                (JobState.RUNNING.value, now),
+            )
+        }
+        shares = {
+            row["department"]: row["finish"]
+            for row in conn.execute("SELECT department, finish FROM scheduler_shares")
+        }
+        clock = shares.pop(CLOCK, 0.0)
+
+        candidates = []
+        for department in backlog:
+            cap = self.max_in_flight(department)
+            if cap and running.get(department, 0) >= cap:
+                continue
+            candidates.append((max(shares.get(department, 0.0), clock), department))
+        if not candidates:
+            return None
+        start, department = min(candidates)
+
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE state = ? AND COALESCE(retry_at, 0) <= ? "
+            "AND department = ? ORDER BY audio_size - (? - created_at) * ?, "
+            "created_at LIMIT 1",
+            (
+                JobState.QUEUED.value,
+                now,
+                department,
+                now,
+                settings.SCHEDULER_AGING_BYTES_PER_SECOND,
+            ),
+        ).fetchone()
+        conn.executemany(
+            "INSERT INTO scheduler_shares (department, finish) VALUES (?, ?) "
+            "ON CONFLICT (department) DO UPDATE SET finish = excluded.finish",
+            [(department, start + 1 / self.weight(department)), (CLOCK, start)],
+        )
+        return row
+
+    def stats(self, conn: sqlite3.Connection) -> Dict[str, dict]:
+        """
+        Queue depth, jobs in flight and queue wait per department. Waits are
+        measured from submission to the first claim, over the last
+        ``SCHEDULER_STATS_WINDOW`` seconds.
+        """
+        now = time.time()
+        departments = {department.value: [] for department in Department}
+        queued, running = {}, {}
+        for row in conn.execute(
+            "SELECT department, state, COUNT(*) AS jobs, MIN(created_at) AS oldest "
+            "FROM jobs WHERE state IN (?, ?) GROUP BY department, state",
+            (JobState.QUEUED.value, JobState.RUNNING.value),
+        ):
+            departments.setdefault(row["department"], [])
+            if row["state"] == JobState.QUEUED.value:
+                queued[row["department"]] = row
+            else:
+                running[row["department"]] = row["jobs"]
+        for row in conn.execute(
+            "SELECT department, first_claimed_at - created_at AS wait FROM jobs "
+            "WHERE first_claimed_at >= ?",
+            (now - settings.SCHEDULER_STATS_WINDOW,),
+        ):
+            departments.setdefault(row["department"], []).append(row["wait"])
+
+        stats = {}
+        for department, waits in departments.items():
+            row = queued.get(department)
+            stats[department or "unknown"] = {
+                "weight": self.weight(department),
+                "max_in_flight": self.max_in_flight(department) or None,
+                "queued": row["jobs"] if row else 0,
+                "running": running.get(department, 0),
+                "oldest_queued_seconds": round(now - row["oldest"], 3) if row else 0,
+                "claimed": len(waits),
+                "wait_seconds": {
+                    "avg": round(sum(waits) / len(waits), 3) if waits else None,
+                    "p95": round(_percentile(waits, 0.95), 3) if waits else None,
+                    "max": round(max(waits), 3) if waits else None,
+                },
+            }
+        return stats
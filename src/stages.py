@@ -0,0 +1,148 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, NamedTuple, Optional
+
+from server import settings
+
+from .metrics import STAGE_WAITING
+from .scheduler import FairScheduler
+
+
+class JobPriority(NamedTuple):
+    department: str = ""
+    audio_size: int = 0
+    queued_at: float = 0.0
+
+
+# set by the job handler; read when one of its stages waits for a slot
+JOB_PRIORITY: ContextVar[JobPriority] = ContextVar(
+    "job_priority", default=JobPriority()
+)
+
+
+@dataclass
+class _Waiter:
+    priority: JobPriority
+    future: asyncio.Future
+
+
+@dataclass
+class FairSemaphore:
+    """
+    asyncio.Semaphore whose free slots go to waiters by the same policy as
+    ``FairScheduler``: departments by weighted fair share, then the smallest
+    audio within a department, with time since submission offsetting size.
+    The waiter's ``JOB_PRIORITY`` decides where it queues.
+    """
+
+    name: str
+    value: int
+    _waiters: Dict[str, List[_Waiter]] = field(default_factory=dict, init=False)
+    _finish: Dict[str, float] = field(default_factory=dict, init=False)
+    _clock: float = field(default=0.0, init=False)
+
+    def _charge(self, department: str):
+        start = max(self._finish.get(department, 0.0), self._clock)
+        self._clock = start
+        self._finish[department] = start + 1 / FairScheduler.weight(department)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        if not self._waiters:
+            return None
+        department = min(
+            self._waiters,
+            key=lambda d: (max(self._finish.get(d, 0.0), self._clock), d),
+        )
+        now = time.time()
+        waiters = self._waiters[department]
+        waiter = min(
+            waiters,
+            key=lambda w: w.priority.audio_size
+            - (now - w.priority.queued_at) * settings.SCHEDULER_AGING_BYTES_PER_SECOND,
+        )
+        waiters.remove(waiter)
+        if not waiters:
+            del self._waiters[department]
+        return waiter
+
+    async def acquire(self):
+        priority = JOB_PRIORITY.get()
+        if self.value > 0 and not self._waiters:
+            self.value -= 1
+            self._charge(priority.department)
+            return
+
+        waiter = _Waiter(priority, asyncio.get_running_loop().create_future())
+        self._waiters.setdefault(priority.department, []).append(waiter)
+        waiting = STAGE_WAITING.labels(self.name, priority.department)
+        waiting.inc()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # the slot was handed over just before the cancellation
+                self.release()
+            else:
+                waiters = self._waiters.get(priority.department, [])
+                if waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiters[priority.department]
+            raise
+        finally:
+            waiting.dec()
+
+    def release(self):
+        while (waiter := self._next_waiter()) is not None:
+            if not waiter.future.done():
+                # the slot passes straight to the waiter
+                self._charge(waiter.priority.department)
+                waiter.future.set_result(None)
+                return
+        self.value += 1
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+@dataclass
+class StageLimits:
+    """
+    Per-process concurrency limits for each pipeline stage. A job only holds
+    the slot of the stage it is in, so while one meeting waits for its
+    transcript the next one can already upload and another can run its
+    patterns. Claimed jobs queue here, so the slots are handed out fairly
+    between departments rather than first come, first served.
+    """
+
+    _upload: Optional[FairSemaphore] = field(default=None, init=False)
+    _transcribe: Optional[FairSemaphore] = field(default=None, init=False)
+    _llm: Optional[FairSemaphore] = field(default=None, init=False)
+
+    @property
+    def upload(self) -> FairSemaphore:
+        if self._upload is None:
+            self._upload = FairSemaphore("upload", settings.STAGE_UPLOAD_CONCURRENCY)
+        return self._upload
+
+    @property
+    def transcribe(self) -> FairSemaphore:
+        if self._transcribe is None:
+            self._transcribe = FairSemaphore(
+                "transcribe", settings.STAGE_TRANSCRIBE_CONCURRENCY
+            )
+        return self._transcribe
+
+    @property
+    def llm(self) -> FairSemaphore:
+        if self._llm is None:
+            self._llm = FairSemaphore("llm", settings.STAGE_LLM_CONCURRENCY)
+        return self._llm
+
+
+stage_limits = StageLimits()
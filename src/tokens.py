@@ -0,0 +1,22 @@
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional, fall back to a character-based estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model_name: str):
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model_name: str = "gpt-4o") -> int:
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(_encoding(model_name).encode(text, disallowed_special=()))
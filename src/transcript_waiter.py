@@ -0,0 +1,268 @@
+import asyncio
+import os
+import re
+import time
+from contextvars import Context
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from server import settings
+
+from .clients import http_clients
+from .constants import TRANSCRIPT_ID_PATTERN, TranscriptStatus
+from .metrics import track_request
+from .rate_limit import rate_limiter
+
+
+@dataclass
+class _PendingTranscript:
+    transcript_id: str
+    future: asyncio.Future
+    deadline: float
+    interval: float
+    next_check: float
+
+
+@dataclass
+class TranscriptWaiter:
+    """
+    Registry of in-flight transcripts and the single poller that resolves them.
+
+    Jobs await a future per transcript id. The future is resolved either when
+    AssemblyAI calls the webhook (``notify``) or when the centralized poller
+    sees the transcript finish. The poller checks all due transcripts in one
+    pass and backs off per transcript, starting from an estimate based on the
+    audio duration.
+    """
+
+    _pending: Dict[str, _PendingTranscript] = field(default_factory=dict, init=False)
+    _wakeup: Optional[asyncio.Event] = field(default=None, init=False)
+    _task: Optional[asyncio.Task] = field(default=None, init=False)
+
+    @property
+    def _marker_dir(self) -> str:
+        # webhooks that land on another gunicorn worker leave a marker here
+        return os.path.join(settings.DATA_DIR, "webhooks")
+
+    @property
+    def webhook_enabled(self) -> bool:
+        # the webhook route rejects every call without a secret to check
+        return bool(
+            settings.ASSEMBLYAI_WEBHOOK_BASE_URL and settings.ASSEMBLYAI_WEBHOOK_SECRET
+        )
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # shared by all jobs, so it must not inherit the first job's trace id
+            self._task = asyncio.create_task(self._run(), context=Context())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.cancel()
+        self._pending.clear()
+
+    async def wait(
+        self, transcript_id: str, audio_duration: Optional[float] = None
+    ) -> Tuple[dict, str]:
+        self._ensure_running()
+
+        now = time.monotonic()
+        duration = audio_duration or 0
+        if self.webhook_enabled:
+            # the webhook is the fast path; polling is only a safety net
+            interval = settings.TRANSCRIPT_POLL_MAX_INTERVAL
+        else:
+            interval = min(
+                max(
+                    duration * settings.TRANSCRIPT_POLL_INITIAL_RATIO,
+                    settings.TRANSCRIPT_POLL_MIN_INTERVAL,
+                ),
+                settings.TRANSCRIPT_POLL_MAX_INTERVAL,
+            )
+        timeout = max(
+            settings.TRANSCRIPT_TIMEOUT_MIN,
+            duration * settings.TRANSCRIPT_TIMEOUT_FACTOR,
+        )
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[transcript_id] = _PendingTranscript(
+            transcript_id=transcript_id,
+            future=future,
+            deadline=now + timeout,
+            interval=interval,
+            next_check=now + interval,
+        )
+        self._wakeup.set()
+        try:
+            return await future
+        finally:
+            self._pending.pop(transcript_id, None)
+
+    async def notify(self, transcript_id: str):
+        """
+        Called by the webhook route when AssemblyAI reports a finished transcript.
+        """
+        pending = self._pending.get(transcript_id)
+        if pending is not None:
+            pending.next_check = time.monotonic()
+            self._wakeup.set()
+            return
+
+        await asyncio.to_thread(self._write_marker, transcript_id)
+
+    def _write_marker(self, transcript_id: str):
+        if not re.match(TRANSCRIPT_ID_PATTERN, transcript_id):
+            raise ValueError(f"Invalid transcript id {transcript_id!r}")
+        os.makedirs(self._marker_dir, exist_ok=True)
+        with open(os.path.join(self._marker_dir, transcript_id), "w"):
+            pass
+
+    def _consume_markers(self, transcript_ids: list) -> list:
+        found = []
+        for transcript_id in transcript_ids:
+            try:
+                os.remove(os.path.join(self._marker_dir, transcript_id))
+            except FileNotFoundError:
+                # no webhook yet, or the marker was just expired
+                continue
+            found.append(transcript_id)
+        return found
+
+    def expire_markers_sync(self, max_age: float) -> int:
+        """
+        Remove markers nobody consumed (transcripts of other deployments or of
+        jobs that already gave up). Returns the number removed.
+        """
+        removed, cutoff = 0, time.time() - max_age
+        try:
+            entries = list(os.scandir(self._marker_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(settings.TRANSCRIPT_POLL_CONCURRENCY)
+
+        while True:
+            timeout = settings.TRANSCRIPT_WEBHOOK_CHECK_INTERVAL
+            if self._pending:
+                next_check = min(p.next_check for p in self._pending.values())
+                timeout = min(timeout, max(next_check - time.monotonic(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            if not self._pending:
+                continue
+
+            try:
+                await self._poll_once(semaphore)
+            except Exception as e:
+                # the poller is shared by every job: one failed pass must not
+                # leave them all waiting until their timeout
+                settings.LOGGER.error(f"Transcript poller pass failed: {str(e)}")
+                await asyncio.sleep(settings.TRANSCRIPT_POLL_MIN_INTERVAL)
+
+    async def _poll_once(self, semaphore: asyncio.Semaphore):
+        if self.webhook_enabled:
+            notified = await asyncio.to_thread(
+                self._consume_markers, list(self._pending)
+            )
+            for transcript_id in notified:
+                if transcript_id in self._pending:
+                    self._pending[transcript_id].next_check = time.monotonic()
+
+        now = time.monotonic()
+        due = [p for p in self._pending.values() if p.next_check <= now]
+        if due:
+            await asyncio.gather(*[self._check(pending, semaphore) for pending in due])
+
+    async def _check(self, pending: _PendingTranscript, semaphore: asyncio.Semaphore):
+        if pending.future.done():
+            return
+
+        async with semaphore:
+            try:
+                result = await self._fetch(pending.transcript_id)
+            except Exception as e:
+                settings.LOGGER.error(
+                    f"Polling transcript {pending.transcript_id} failed: {str(e)}"
+                )
+                result = None
+
+        now = time.monotonic()
+        if result is None and now > pending.deadline:
+            settings.LOGGER.error(f"Transcription {pending.transcript_id} timed out")
+            result = ({}, TranscriptStatus.ERROR.value)
+
+        if result is not None:
+            if not pending.future.done():
+                pending.future.set_result(result)
+            return
+
+        pending.interval = min(
+            pending.interval * settings.TRANSCRIPT_POLL_BACKOFF,
+            settings.TRANSCRIPT_POLL_MAX_INTERVAL,
+        )
+        pending.next_check = now + pending.interval
+
+    @staticmethod
+    async def _fetch(transcript_id: str) -> Optional[Tuple[dict, str]]:
+        """
+        Return (transcript, status) once the transcript is final, None otherwise.
+        """
+        url = f"{settings.ASSEMBLYAI_BASE_URL}/transcript/{transcript_id}"
+        headers = {"Authorization": settings.ASSEMBLYAI_API_KEY}
+        settings.LOGGER.info(f"Requesting transcription for SRT-ID: {transcript_id}")
+
+        await rate_limiter.acquire("assemblyai:requests", settings.ASSEMBLYAI_RPM)
+        session = http_clients.session
+        with track_request("assemblyai", "poll"):
+            async with session.get(url, headers=headers) as response:
+                if response.status == 429 or response.status >= 500:
+                    # transient, try again on the next backoff step
+                    return None
+                if response.status >= 400:
+                    return {}, TranscriptStatus.ERROR.value
+                task: dict = await response.json()
+
+        _status = task["status"]
+        if _status == TranscriptStatus.ERROR.value:
+            settings.LOGGER.error(f"Transcription error for {transcript_id}")
+            return {}, _status
+
+        if _status in (
+            TranscriptStatus.PROCESSING.value,
+            TranscriptStatus.QUEUED.value,
+        ):
+            return None
+
+        # check for spoken words
+        if len(task["words"]) >= 10:
+            return task, _status
+
+        settings.LOGGER.error(
+            f"Transcription {transcript_id} has less than 10 spoken words. "
+        )
+        return {}, "less_than_10_words"
+
+
+transcript_waiter = TranscriptWaiter()
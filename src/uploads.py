@@ -0,0 +1,371 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from server import settings
+
+from .constants import UploadState
+
+
+@dataclass
+class UploadSession:
+    id: str
+    filename: str
+    size: int
+    sha256: Optional[str]
+    meeting: dict
+    state: UploadState
+    job_id: Optional[str]
+    save_dir: Optional[str]
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "UploadSession":
+        return cls(
+            id=row["id"],
+            filename=row["filename"],
+            size=row["size"],
+            sha256=row["sha256"],
+            meeting=json.loads(row["meeting"]),
+            state=UploadState(row["state"]),
+            job_id=row["job_id"],
+            save_dir=row["save_dir"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+
+def merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merge (offset, length) chunks into sorted, non-overlapping [start, end)
+    ranges.
+    """
+    merged: List[List[int]] = []
+    for offset, length in sorted(ranges):
+        end = offset + length
+        if merged and offset <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([offset, end])
+    return [(start, end) for start, end in merged]
+
+
+def missing_ranges(received: List[Tuple[int, int]], size: int) -> List[Tuple[int, int]]:
+    missing, position = [], 0
+    for start, end in received:
+        if start > position:
+            missing.append((position, start))
+        position = max(position, end)
+    if position < size:
+        missing.append((position, size))
+    return missing
+
+
+@dataclass
+class UploadStore:
+    """
+    Resumable upload sessions. Each session owns a file preallocated to the
+    announced size; chunks are written at their offset by whichever worker
+    receives them, so a client can send them in parallel and in any order.
+    Received chunks and their SHA-256 are recorded in SQLite, which tells the
+    client what is still missing after a dropped connection.
+    """
+
+    db_path: str
+    root: str
+    _schema_ready: bool = field(default=False, init=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+            self._schema_ready = True
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                sha256 TEXT,
+                meeting TEXT NOT NULL,
+                state TEXT NOT NULL,
+                job_id TEXT,
+                save_dir TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS upload_chunks (
+                upload_id TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                PRIMARY KEY (upload_id, offset, length)
+            )
+            """)
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    def _create_sync(
+        self,
+        filename: str,
+        size: int,
+        sha256: Optional[str],
+        meeting: dict,
+        max_reserved: Optional[int],
+    ) -> Optional[UploadSession]:
+        """
+        Open a session and preallocate its file. Returns None if that would
+        exceed ``UPLOAD_SESSION_MAX_OPEN`` sessions, or ``max_reserved`` bytes
+        reserved by the sessions not yet finalized.
+        """
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        try:
+            # reservations are checked and taken in one transaction, so
+            # concurrent creates on other workers cannot overshoot together
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT COUNT(*) AS sessions, COALESCE(SUM(size), 0) AS reserved "
+                "FROM upload_sessions WHERE state IN (?, ?)",
+                (UploadState.OPEN.value, UploadState.FINALIZING.value),
+            ).fetchone()
+            if (
+                settings.UPLOAD_SESSION_MAX_OPEN
+                and row["sessions"] >= settings.UPLOAD_SESSION_MAX_OPEN
+            ) or (max_reserved is not None and row["reserved"] + size > max_reserved):
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                "INSERT INTO upload_sessions (id, filename, size, sha256, meeting, "
+                "state, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    upload_id,
+                    filename,
+                    size,
+                    sha256,
+                    json.dumps(meeting),
+                    UploadState.OPEN.value,
+                    now,
+                    now,
+                ),
+            )
+            row = conn.execute(
+                "SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)
+            ).fetchone()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        # reserve the space up front: a full disk fails here rather than
+        # after the client has sent most of the file
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            fd = os.open(self.path(upload_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            try:
+                if size and hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, size)
+                else:
+                    os.ftruncate(fd, size)
+            finally:
+                os.close(fd)
+        except OSError:
+            self._delete_sync(upload_id)
+            raise
+        return UploadSession.from_row(row)
+
+    def _get_sync(self, upload_id: str) -> Optional[UploadSession]:
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return UploadSession.from_row(row) if row else None
+
+    def _write_sync(self, upload_id: str, offset: int, data: bytes):
+        fd = os.open(self.path(upload_id), os.O_WRONLY)
+        try:
+            while data:
+                written = os.pwrite(fd, data, offset)
+                data, offset = data[written:], offset + written
+        finally:
+            os.close(fd)
+
+    def _record_chunk_sync(self, upload_id: str, offset: int, length: int, sha: str):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO upload_chunks (upload_id, offset, length, "
+                "sha256) VALUES (?, ?, ?, ?)",
+                (upload_id, offset, length, sha),
+            )
+            conn.execute(
+                "UPDATE upload_sessions SET updated_at = ? WHERE id = ?",
+                (time.time(), upload_id),
+            )
+        finally:
+            conn.close()
+
+    def _received_sync(self, upload_id: str) -> List[Tuple[int, int]]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT offset, length FROM upload_chunks WHERE upload_id = ?",
+                (upload_id,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return merge_ranges([(row["offset"], row["length"]) for row in rows])
+
+    def _begin_finalize_sync(self, upload_id: str) -> Optional[UploadSession]:
+        """
+        Move a complete, open session to FINALIZING so only one request turns
+        it into a job. Returns the session as it was before the change.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)
+            ).fetchone()
+            if row is not None and row["state"] == UploadState.OPEN.value:
+                conn.execute(
+                    "UPDATE upload_sessions SET state = ?, updated_at = ? WHERE id = ?",
+                    (UploadState.FINALIZING.value, time.time(), upload_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return UploadSession.from_row(row) if row else None
+
+    def _finish_sync(
+        self,
+        upload_id: str,
+        state: UploadState,
+        job_id: Optional[str] = None,
+        save_dir: Optional[str] = None,
+        clear_chunks: bool = False,
+    ):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE upload_sessions SET state = ?, job_id = ?, save_dir = ?, "
+                "updated_at = ? WHERE id = ?",
+                (state.value, job_id, save_dir, time.time(), upload_id),
+            )
+            if clear_chunks:
+                conn.execute(
+                    "DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _delete_sync(self, upload_id: str):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+            conn.execute("DELETE FROM upload_sessions WHERE id = ?", (upload_id,))
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        try:
+            os.remove(self.path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def expire_sync(self, max_age: float) -> int:
+        """
+        Drop sessions that have not changed for ``max_age`` seconds, with their
+        partial files. Returns the number of sessions removed.
+        """
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM upload_sessions WHERE updated_at < ?",
+                (time.time() - max_age,),
+            ).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            self._delete_sync(row["id"])
+        return len(rows)
+
+    @staticmethod
+    def _hash_file_sync(path: str) -> str:
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(settings.UPLOAD_CHUNK_SIZE):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    async def create(
+        self,
+        filename: str,
+        size: int,
+        sha256: Optional[str],
+        meeting: dict,
+        max_reserved: Optional[int] = None,
+    ) -> Optional[UploadSession]:
+        return await asyncio.to_thread(
+            self._create_sync, filename, size, sha256, meeting, max_reserved
+        )
+
+    async def get(self, upload_id: str) -> Optional[UploadSession]:
+        return await asyncio.to_thread(self._get_sync, upload_id)
+
+    async def write(self, upload_id: str, offset: int, data: bytes):
+        await asyncio.to_thread(self._write_sync, upload_id, offset, data)
+
+    async def record_chunk(self, upload_id: str, offset: int, length: int, sha: str):
+        await asyncio.to_thread(self._record_chunk_sync, upload_id, offset, length, sha)
+
+    async def received(self, upload_id: str) -> List[Tuple[int, int]]:
+        return await asyncio.to_thread(self._received_sync, upload_id)
+
+    async def begin_finalize(self, upload_id: str) -> Optional[UploadSession]:
+        return await asyncio.to_thread(self._begin_finalize_sync, upload_id)
+
+    async def finish(self, upload_id: str, state: UploadState, **updates):
+        await asyncio.to_thread(self._finish_sync, upload_id, state, **updates)
+
+    async def delete(self, upload_id: str):
+        await asyncio.to_thread(self._delete_sync, upload_id)
+
+    async def hash_file(self, upload_id: str) -> str:
+        return await asyncio.to_thread(self._hash_file_sync, self.path(upload_id))
+
+
+upload_store = UploadStore(
+    db_path=os.path.join(settings.DATA_DIR, "uploads.db"),
+    root=os.path.join(settings.DATA_DIR, "uploads"),
+)
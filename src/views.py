@@ -1,20 +1,43 @@
 import asyncio
+import hashlib
 import json
 import os
 import shutil
+import uuid
+from collections import Counter
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Literal
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Dict, List, Literal, Optional, Tuple
 
 import aiofiles
+import aiofiles.os
 from fastapi import UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.datastructures import Headers
 
 from server import settings
+from server.settings import TRACE_ID
 
-from .agents import AssemblyAiAgent, OpenAiAgent
+from .agents import AssemblyAiAgent, OpenAiAgent, StreamingUpload
 from .agents_schema import TranscribingConfig
-from .constants import Department, KnowledgePattern
+from .audio import audio_preprocessor
+from .cache import transcript_cache, transcript_cache_key
+from .catalog import CatalogEntry, meeting_catalog
+from .compression import available_encodings, write_precompressed
+from .constants import (
+    Department,
+    JobStage,
+    JobState,
+    KnowledgePattern,
+    UploadState,
+)
+from .jobs import Job, PermanentJobError, job_queue
+from .metrics import track_stage
+from .retention import retention_sweeper
+from .stages import JOB_PRIORITY, JobPriority, stage_limits
+from .uploads import UploadSession, missing_ranges, upload_store
+from .word_store import WORDS_FILENAME, WordStore, write_word_store
 
 
 @dataclass
@@ -23,52 +46,282 @@ class MeetingProcessor:
     meeting_subject: str
     knowledge_patterns: List[KnowledgePattern]
     department: Department
-    audio_file: UploadFile
-    audio_file_path: str = field(default=None, init=False)
+    audio_file: Optional[UploadFile] = None
+    return_type: Literal["json", "markdown"] = "markdown"
 
-    save_dir: str = field(default=None, init=False)
+    # set once the audio is saved; persisted with the job so it can be resumed
+    save_dir: str = None
+    audio_file_path: str = None
+    audio_sha256: str = None
+    audio_size: int = 0
+    batch_id: Optional[str] = None
+    trace_id: Optional[str] = None
+
+    job: Optional[Job] = field(default=None, init=False)
+    tee_upload: Optional[StreamingUpload] = field(default=None, init=False)
+    transcript_data: Optional[dict] = field(default=None, init=False)
 
     def __post_init__(self):
-        department_dir = self.department.value.lower().replace(" ", "_")
-        date_dir = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        self.save_dir = os.path.join(settings.UPLOAD_DIR, department_dir, date_dir)
+        if self.save_dir is None:
+            # concurrent submits within the same second must not share a
+            # directory (and with it a catalog row)
+            self.save_dir = self.meeting_dir(
+                self.department, f"_{uuid.uuid4().hex[:8]}"
+            )
         os.makedirs(self.save_dir, exist_ok=True)
 
+    @staticmethod
+    def meeting_dir(department: Department, suffix: str = "") -> str:
+        department_dir = department.value.lower().replace(" ", "_")
+        date_dir = datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + suffix
+        return os.path.join(settings.UPLOAD_DIR, department_dir, date_dir)
+
+    def to_payload(self) -> dict:
+        return {
+            "language": self.language,
+            "meeting_subject": self.meeting_subject,
+            "knowledge_patterns": [p.value for p in self.knowledge_patterns],
+            "department": self.department.value,
+            "return_type": self.return_type,
+            "save_dir": self.save_dir,
+            "audio_file_path": self.audio_file_path,
+            "audio_sha256": self.audio_sha256,
+            "audio_size": self.audio_size,
+            "batch_id": self.batch_id,
+            "trace_id": self.trace_id,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> "MeetingProcessor":
+        return cls(
+            **{
+                **payload,
+                "knowledge_patterns": [
+                    KnowledgePattern(p) for p in payload["knowledge_patterns"]
+                ],
+                "department": Department(payload["department"]),
+            }
+        )
+
+    @classmethod
+    async def run_job(cls, job: Job):
+        """
+        Job handler: run (or resume) the pipeline for a queued meeting.
+        """
+        processor = cls.from_payload(job.payload)
+        processor.job = job
+        # where this job queues for the stage slots it shares with other jobs
+        JOB_PRIORITY.set(
+            JobPriority(
+                processor.department.value, processor.audio_size, job.created_at
+            )
+        )
+        await processor._async_task()
+
+    @property
+    def _checkpoint_data(self) -> dict:
+        return self.job.checkpoint if self.job else {}
+
+    async def _checkpoint(self, stage: JobStage, **data):
+        if not self.job:
+            return
+        await job_queue.store.checkpoint(self.job.id, stage, **data)
+        if stage == JobStage.PATTERN:
+            for result in data["patterns"].values():
+                await job_queue.publish(self.job.id, "pattern", **result)
+        else:
+            await job_queue.publish(self.job.id, "stage", stage=stage.value)
+
+    async def _on_pattern_delta(self, pattern: str, text: str):
+        await job_queue.publish(
+            self.job.id, "pattern_delta", pattern=pattern, text=text
+        )
+
     async def _save_audio_file(self) -> bool:
         save_path = os.path.join(self.save_dir, self.audio_file.filename)
 
+        if settings.ASSEMBLYAI_TEE_UPLOAD:
+            self.tee_upload = StreamingUpload(agent=AssemblyAiAgent())
+
+        audio_hash = hashlib.sha256()
         try:
             async with aiofiles.open(save_path, "wb") as buffer:
-                chunk_size = 1024 * 1024  # 1 MB chunks
                 while True:
-                    chunk = await self.audio_file.read(chunk_size)
+                    chunk = await self.audio_file.read(settings.UPLOAD_CHUNK_SIZE)
                     if not chunk:
                         break
                     await buffer.write(chunk)
+                    audio_hash.update(chunk)
+                    self.audio_size += len(chunk)
+                    if self.tee_upload:
+                        await self.tee_upload.feed(chunk)
+            if self.tee_upload:
+                await self.tee_upload.close()
             self.audio_file_path = save_path
+            self.audio_sha256 = audio_hash.hexdigest()
             return True
         except Exception as e:
             settings.LOGGER.error(f"Error saving audio file: {str(e)}")
+            if self.tee_upload:
+                self.tee_upload.abort()
+                self.tee_upload = None
+            return False
+
+    @staticmethod
+    def _read_json(path: str) -> dict:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    async def _preprocess_audio(self) -> Tuple[str, int]:
+        """
+        Return the file to upload and the milliseconds of leading silence cut
+        from it: a smaller mono copy of the audio when preprocessing is
+        enabled and helps, the original (with no offset) otherwise.
+        """
+        checkpoint = self._checkpoint_data
+        offset_ms = checkpoint.get("audio_offset_ms", 0)
+        if checkpoint.get("audio_url") or checkpoint.get("transcript_id"):
+            # already uploaded (tee'd upload or resumed job)
+            return self.audio_file_path, offset_ms
+
+        preprocessed_path = checkpoint.get("preprocessed_path")
+        if preprocessed_path and os.path.exists(preprocessed_path):
+            return preprocessed_path, offset_ms
+
+        if not audio_preprocessor.enabled:
+            return self.audio_file_path, 0
+
+        with track_stage("preprocess"):
+            result = await audio_preprocessor.process(self.audio_file_path)
+        if result is None:
+            return self.audio_file_path, 0
+
+        await self._checkpoint(
+            JobStage.PREPROCESSED,
+            preprocessed_path=result.path,
+            audio_offset_ms=result.offset_ms,
+            preprocess={
+                "input_bytes": result.input_bytes,
+                "output_bytes": result.output_bytes,
+                "bytes_saved": result.bytes_saved,
+                "seconds": round(result.seconds, 3),
+            },
+        )
+        return result.path, result.offset_ms
+
+    @staticmethod
+    def _shift_timestamps(transcript_data: dict, offset_ms: int):
+        # map timings of the trimmed upload back onto the original recording
+        utterances = transcript_data.get("utterances") or []
+        items = [*(transcript_data.get("words") or []), *utterances]
+        for utterance in utterances:
+            items.extend(utterance.get("words") or [])
+        for item in items:
+            for key in ("start", "end"):
+                if item.get(key) is not None:
+                    item[key] += offset_ms
+
+    def _transcribing_config(self) -> TranscribingConfig:
+        return TranscribingConfig(language_code=self.language, speaker_labels=False)
+
+    async def _transcript_cached(self) -> bool:
+        if not settings.TRANSCRIPT_CACHE_ENABLED or not self.audio_sha256:
             return False
+        key = transcript_cache_key(self.audio_sha256, self._transcribing_config())
+        # the worker does the counted lookup; this one must not count it twice
+        return await transcript_cache.contains(key)
+
+    async def _tee_checkpoint(self) -> Optional[dict]:
+        audio_url = await self.tee_upload.audio_url()
+        return {"audio_url": audio_url} if audio_url else None
 
     async def _transcribe_audio(self):
+        checkpoint = self._checkpoint_data
+        transcript_path = checkpoint.get("transcript_path")
+        if transcript_path and os.path.exists(transcript_path):
+            settings.LOGGER.info(f"Resuming from saved transcript {transcript_path}")
+            self.transcript_data = await asyncio.to_thread(
+                self._read_json, transcript_path
+            )
+            return self.transcript_data.get("text", "")
+
         agent = AssemblyAiAgent()
-        config = TranscribingConfig(language_code=self.language, speaker_labels=False)
-        transcript_data, transcript_status = await agent.transcribe_audio(
-            config=config, file_path=self.audio_file_path
+        config = self._transcribing_config()
+
+        cache_key = None
+        transcript_data = None
+        if settings.TRANSCRIPT_CACHE_ENABLED and self.audio_sha256:
+            cache_key = transcript_cache_key(self.audio_sha256, config)
+            transcript_data = await transcript_cache.get(cache_key)
+            if transcript_data is not None:
+                settings.LOGGER.info(f"Transcript cache hit for {self.audio_file_path}")
+
+        if transcript_data is None:
+            audio_duration = self.audio_size / settings.AUDIO_BYTES_PER_SECOND_ESTIMATE
+            upload_path, offset_ms = await self._preprocess_audio()
+            transcript_data, transcript_status = await agent.transcribe_audio(
+                config=config,
+                file_path=upload_path,
+                audio_url=checkpoint.get("audio_url"),
+                transcript_id=checkpoint.get("transcript_id"),
+                audio_duration=audio_duration,
+                on_checkpoint=self._checkpoint,
+            )
+
+            if transcript_status == "less_than_10_words":
+                # the same audio gives the same transcript, don't retry
+                raise PermanentJobError("The recording has fewer than 10 spoken words")
+            if transcript_status != "completed":
+                # the transcript failed for good: drop it (and the upload it was
+                # made from) so the retry uploads and submits again
+                await self._checkpoint(
+                    JobStage.SAVED, audio_url=None, transcript_id=None
+                )
+                raise ValueError(
+                    f"Transcription failed with status: {transcript_status}"
+                )
+
+            if offset_ms:
+                self._shift_timestamps(transcript_data, offset_ms)
+            if cache_key:
+                await transcript_cache.set(cache_key, transcript_data)
+
+        # word timings go to a compact columnar file instead of the JSON
+        words_path = os.path.join(self.save_dir, WORDS_FILENAME)
+        await asyncio.to_thread(
+            write_word_store, words_path, transcript_data.get("words") or []
         )
+        transcript_data = {k: v for k, v in transcript_data.items() if k != "words"}
 
-        if transcript_status != "completed":
-            raise ValueError(f"Transcription failed with status: {transcript_status}")
+        transcript_path = os.path.join(self.save_dir, "transcript.json")
+        async with aiofiles.open(transcript_path, "w") as f:
+            await f.write(json.dumps(transcript_data))
+        await self._checkpoint(JobStage.TRANSCRIBED, transcript_path=transcript_path)
 
+        self.transcript_data = transcript_data
         return transcript_data.get("text", "")
 
+    async def _on_pattern_result(self, result: dict):
+        await self._checkpoint(JobStage.PATTERN, patterns={result["pattern"]: result})
+
     async def _process_patterns(self, transcript: str):
         agent = OpenAiAgent(
             knowledge_patterns=self.knowledge_patterns,
             transcript=transcript,
+            transcript_data=self.transcript_data,
+            on_delta=(
+                self._on_pattern_delta
+                if self.job and settings.STREAM_PATTERN_TOKENS
+                else None
+            ),
+            watched=bool(self.job) and job_queue.has_listeners(self.job.id),
         )
-        return await agent.process_all_patterns()
+        with track_stage("patterns"):
+            async with stage_limits.llm:
+                return await agent.process_all_patterns(
+                    done=self._checkpoint_data.get("patterns"),
+                    on_result=self._on_pattern_result,
+                )
 
     async def _save_output_files(
         self,
@@ -83,7 +336,10 @@ class MeetingProcessor:
             for result in patterns_results:
                 pattern = result["pattern"]
                 content = result["response"]
-                combined_content.append({pattern: content})
+                if content is None:
+                    combined_content.append({pattern: None, "error": result["error"]})
+                else:
+                    combined_content.append({pattern: content})
 
             file_content = json.dumps(combined_content, indent=4)
 
@@ -93,26 +349,97 @@ class MeetingProcessor:
             for result in patterns_results:
                 pattern = result["pattern"]
                 content = result["response"]
+                if content is None:
+                    content = f"_Failed to generate this section: {result['error']}_"
                 combined_content.append(f"# {pattern.upper()}\n\n{content}")
 
             # Join all sections with a markdown separator
             file_content = "\n\n---\n\n".join(combined_content)
 
         file_path = os.path.join(self.save_dir, filename)
-        async with aiofiles.open(file_path, "w") as f:
-            await f.write(file_content)
+        with track_stage("write"):
+            async with aiofiles.open(file_path, "w") as f:
+                await f.write(file_content)
+            if settings.PRECOMPRESS_RESULTS:
+                await asyncio.to_thread(write_precompressed, file_path)
+        await self._checkpoint(JobStage.WRITTEN, output_path=file_path)
+        await self._update_catalog(patterns_results, file_path)
+
+    async def _update_catalog(
+        self, patterns_results: List[Dict[str, str]], output_path: str
+    ):
+        entry = CatalogEntry(
+            save_dir=self.save_dir,
+            job_id=self.job.id if self.job else None,
+            meeting_subject=self.meeting_subject,
+            department=self.department.value,
+            language=self.language,
+            patterns=[result["pattern"] for result in patterns_results],
+            output_path=output_path,
+            transcript=(self.transcript_data or {}).get("text") or "",
+            content="\n\n".join(
+                result["response"] for result in patterns_results if result["response"]
+            ),
+            created_at=self.job.created_at if self.job else None,
+        )
+        try:
+            await meeting_catalog.upsert(entry)
+        except Exception as e:
+            # the results are on disk either way; only search is affected
+            settings.LOGGER.error(f"Error indexing {self.save_dir}: {str(e)}")
 
-    async def _async_task(self, return_type: str):
+    async def _async_task(self):
         transcript = await self._transcribe_audio()
         patterns_results = await self._process_patterns(transcript)
-        return await self._save_output_files(patterns_results, return_type)
+        failed = [r["pattern"] for r in patterns_results if r["response"] is None]
+        attempts = self.job.attempts if self.job else settings.JOB_MAX_ATTEMPTS
+        if failed and attempts < settings.JOB_MAX_ATTEMPTS:
+            # the job is retried; patterns that succeeded are in the checkpoint
+            # and only the failed ones run again
+            raise ValueError(f"Patterns failed: {', '.join(failed)}")
+
+        await self._save_output_files(patterns_results, self.return_type)
+        if failed:
+            # out of attempts: keep the partial results, but fail the job
+            raise ValueError(
+                f"Patterns failed after {attempts} attempts: {', '.join(failed)}"
+            )
+
+    async def submit(self) -> Optional[str]:
+        """
+        Save the audio and queue the meeting. Returns the job id, or None if
+        the audio could not be saved.
+        """
+        # resumable uploads arrive with the audio already on disk
+        if self.audio_file_path is None:
+            with track_stage("save"):
+                saved = await self._save_audio_file()
+            if not saved:
+                return None
+        self.trace_id = TRACE_ID.get()
+
+        if self.tee_upload and await self._transcript_cached():
+            # the worker will use the cached transcript, the upload is wasted
+            self.tee_upload.abort()
+            self.tee_upload = None
+        if self.tee_upload:
+            # the tee'd upload lives in this process: the job waits for its
+            # audio_url in the background instead of the response waiting for it
+            return await job_queue.enqueue_when_ready(
+                self.to_payload(),
+                JobStage.SAVED,
+                self._tee_checkpoint(),
+                JobStage.UPLOADED,
+                settings.TEE_UPLOAD_HOLD_SECONDS,
+            )
+        return await job_queue.enqueue(self.to_payload(), JobStage.SAVED)
 
     async def build_knowledge_base(
         self, return_type: Literal["json", "markdown"] = "markdown"
     ):
-        if await self._save_audio_file():
-            asyncio.create_task(self._async_task(return_type))
-
+        self.return_type = return_type
+        job_id = await self.submit()
+        if job_id:
             # save_dir is in /Users/satyarthraghuvanshi/projects/hakuna-matata/uploads/trademan/2024-09-17_12-29-16
             # replace all the / with -
             _save_dir = self.save_dir.replace("/", "+")
@@ -120,6 +447,7 @@ class MeetingProcessor:
                 content={
                     "message": "Audio file saved successfully. Building knowledge base...",
                     "dir_search_path": _save_dir,
+                    "job_id": job_id,
                 }
             )
         return JSONResponse(
@@ -131,41 +459,478 @@ class MeetingProcessor:
         )
 
 
-class FetchWisdomFile:
-    async def _schedule_file_deletion(self, file_dir: str):
-        _del_time = settings.FILE_DELETE_TIME
-        settings.LOGGER.info(f"Scheduling file deletion in {_del_time} seconds")
-        await asyncio.sleep(_del_time)
+@dataclass
+class BatchProcessor:
+    """
+    Queues many recordings with shared settings under one batch id. Each file
+    becomes its own job as soon as it is saved, so workers start uploading the
+    first files while later ones are still being written; the per-stage limits
+    in ``stage_limits`` keep the stages overlapping across jobs.
+    """
+
+    language: str
+    meeting_subject: str
+    knowledge_patterns: List[KnowledgePattern]
+    department: Department
+    audio_files: List[UploadFile] = field(default_factory=list)
+    batch_id: str = field(default_factory=lambda: uuid.uuid4().hex)
 
-        # split the file_dir to get the last directory
-        _last_dir = file_dir.split("/")[-1]
-        settings.LOGGER.info(f"Deleting files in {_last_dir}")
+    async def submit(self, return_type: Literal["json", "markdown"] = "markdown"):
+        jobs = []
+        for position, audio_file in enumerate(self.audio_files):
+            processor = MeetingProcessor(
+                language=self.language,
+                meeting_subject=f"{self.meeting_subject} ({audio_file.filename})",
+                knowledge_patterns=self.knowledge_patterns,
+                department=self.department,
+                audio_file=audio_file,
+                return_type=return_type,
+                batch_id=self.batch_id,
+                # files saved within the same second must not share a directory
+                save_dir=MeetingProcessor.meeting_dir(
+                    self.department, f"_{self.batch_id[:8]}_{position:03d}"
+                ),
+            )
+            job_id = await processor.submit()
+            if job_id:
+                await job_queue.store.add_to_batch(self.batch_id, position, job_id)
+            jobs.append(
+                {
+                    "filename": audio_file.filename,
+                    "job_id": job_id,
+                    "dir_search_path": (
+                        processor.save_dir.replace("/", "+") if job_id else None
+                    ),
+                }
+            )
+
+        if not any(job["job_id"] for job in jobs):
+            return JSONResponse(
+                content={"message": "Failed to save audio files", "jobs": jobs},
+                status_code=400,
+            )
+        return JSONResponse(
+            content={
+                "message": f"Queued {sum(1 for job in jobs if job['job_id'])} "
+                f"of {len(jobs)} audio files. Building knowledge base...",
+                "batch_id": self.batch_id,
+                "jobs": jobs,
+            }
+        )
 
-        for file in os.listdir(file_dir):
-            os.remove(os.path.join(file_dir, file))
-        # delete the _last_dir
-        os.rmdir(file_dir)
+    @staticmethod
+    async def status(batch_id: str):
+        jobs = await job_queue.store.batch_jobs(batch_id)
+        if not jobs:
+            return JSONResponse(
+                content={"message": "Batch not found.", "batch_id": batch_id},
+                status_code=404,
+            )
 
-    async def get(self, dir_search_path: str):
-        _file_search_dir = dir_search_path.replace("+", "/")
-        print(_file_search_dir)
+        states = Counter(job.state.value for job in jobs)
+        return JSONResponse(
+            content={
+                "batch_id": batch_id,
+                "done": all(
+                    job.state in (JobState.COMPLETED, JobState.FAILED) for job in jobs
+                ),
+                "states": states,
+                "jobs": [
+                    {
+                        **job.to_dict(),
+                        "meeting_subject": job.payload["meeting_subject"],
+                        "dir_search_path": job.payload["save_dir"].replace("/", "+"),
+                    }
+                    for job in jobs
+                ],
+            }
+        )
+
+
+class ResumableUpload:
+    """
+    Chunked alternative to ``/submit-meeting`` for long recordings: a client
+    opens a session, PUTs chunks at byte offsets (in parallel, in any order,
+    retrying only what failed) and finalizes it into the normal pipeline.
+    """
+
+    MAX_MISSING_RANGES = 100
+
+    @classmethod
+    def _session_content(
+        cls, session: UploadSession, received: List[Tuple[int, int]]
+    ) -> dict:
+        missing = missing_ranges(received, session.size)
+        return {
+            "upload_id": session.id,
+            "filename": session.filename,
+            "size": session.size,
+            "state": session.state.value,
+            "received_bytes": sum(end - start for start, end in received),
+            # resume point for clients that upload sequentially
+            "offset": received[0][1] if received and received[0][0] == 0 else 0,
+            "complete": not missing,
+            "missing": [list(r) for r in missing[: cls.MAX_MISSING_RANGES]],
+            "chunk_size": settings.UPLOAD_SESSION_CHUNK_SIZE,
+            "max_chunk_size": settings.UPLOAD_SESSION_MAX_CHUNK_BYTES,
+            "job_id": session.job_id,
+            "dir_search_path": (
+                session.save_dir.replace("/", "+") if session.save_dir else None
+            ),
+        }
+
+    @staticmethod
+    def _not_found(upload_id: str) -> JSONResponse:
+        return JSONResponse(
+            content={"message": "Upload not found.", "upload_id": upload_id},
+            status_code=404,
+        )
 
-        # check if file exists
-        if not os.path.exists(_file_search_dir):
+    async def create(
+        self,
+        language: str,
+        meeting_subject: str,
+        knowledge_patterns: List[KnowledgePattern],
+        department: Department,
+        filename: str,
+        size: int,
+        sha256: Optional[str] = None,
+    ):
+        filename = os.path.basename(filename)
+        if not filename or size <= 0:
+            return JSONResponse(
+                content={"message": "filename and a positive size are required."},
+                status_code=400,
+            )
+        if size > settings.UPLOAD_SESSION_MAX_BYTES:
             return JSONResponse(
                 content={
-                    "message": "File not found. Try again.",
-                    "file_path": None,
+                    "message": f"Uploads are limited to "
+                    f"{settings.UPLOAD_SESSION_MAX_BYTES} bytes."
                 },
-                status_code=404,
+                status_code=413,
+            )
+
+        meeting = {
+            "language": language,
+            "meeting_subject": meeting_subject,
+            "knowledge_patterns": [p.value for p in knowledge_patterns],
+            "department": department.value,
+        }
+        # open sessions count against the uploads quota before they are sent
+        max_reserved = None
+        if settings.UPLOAD_DIR_MAX_BYTES:
+            usage = await asyncio.to_thread(retention_sweeper.usage_sync)
+            max_reserved = settings.UPLOAD_DIR_MAX_BYTES - usage
+        try:
+            session = await upload_store.create(
+                filename,
+                size,
+                sha256.lower() if sha256 else None,
+                meeting,
+                max_reserved=max_reserved,
+            )
+        except OSError as e:
+            settings.LOGGER.error(f"Error creating upload session: {str(e)}")
+            return JSONResponse(
+                content={"message": "Not enough space for the upload."},
+                status_code=507,
             )
+        if session is None:
+            return JSONResponse(
+                content={
+                    "message": "Too many uploads in progress for the available "
+                    "space, try again later."
+                },
+                status_code=507,
+            )
+        return JSONResponse(content=self._session_content(session, []), status_code=201)
+
+    async def status(self, upload_id: str):
+        session = await upload_store.get(upload_id)
+        if session is None:
+            return self._not_found(upload_id)
+        received = await upload_store.received(upload_id)
+        return JSONResponse(content=self._session_content(session, received))
+
+    async def put_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        body: AsyncIterator[bytes],
+        chunk_sha256: Optional[str] = None,
+    ):
+        session = await upload_store.get(upload_id)
+        if session is None:
+            return self._not_found(upload_id)
+        if session.state != UploadState.OPEN:
+            return JSONResponse(
+                content={
+                    "message": f"Upload is {session.state.value}.",
+                    "upload_id": upload_id,
+                },
+                status_code=409,
+            )
+        if not 0 <= offset < session.size:
+            return JSONResponse(
+                content={"message": f"offset must be in [0, {session.size})."},
+                status_code=400,
+            )
+
+        max_length = min(session.size - offset, settings.UPLOAD_SESSION_MAX_CHUNK_BYTES)
+        chunk_hash = hashlib.sha256()
+        buffer = bytearray()
+        # the chunk is held in memory (at most max_length) and written only once
+        # it is complete and verified, so a bad retry of a range that was
+        # already received cannot overwrite the good bytes
+        async for piece in body:
+            if len(buffer) + len(piece) > max_length:
+                return JSONResponse(
+                    content={
+                        "message": f"Chunk at offset {offset} may be at most "
+                        f"{max_length} bytes."
+                    },
+                    status_code=413,
+                )
+            buffer += piece
+            chunk_hash.update(piece)
+
+        length = len(buffer)
+        if not length:
+            return JSONResponse(
+                content={"message": "Empty chunk."},
+                status_code=400,
+            )
+        digest = chunk_hash.hexdigest()
+        if chunk_sha256 and chunk_sha256.lower() != digest:
+            # nothing written or recorded; the range keeps its previous state
+            return JSONResponse(
+                content={
+                    "message": "Chunk checksum mismatch.",
+                    "offset": offset,
+                    "length": length,
+                    "sha256": digest,
+                },
+                status_code=400,
+            )
+
+        try:
+            await upload_store.write(upload_id, offset, bytes(buffer))
+        except FileNotFoundError:
+            # finalized or removed while this chunk was arriving
+            return JSONResponse(
+                content={
+                    "message": "Upload is no longer open.",
+                    "upload_id": upload_id,
+                },
+                status_code=409,
+            )
+
+        await upload_store.record_chunk(upload_id, offset, length, digest)
+        received = await upload_store.received(upload_id)
+        return JSONResponse(
+            content={
+                **self._session_content(session, received),
+                "chunk": {"offset": offset, "length": length, "sha256": digest},
+            }
+        )
+
+    async def finalize(self, upload_id: str):
+        session = await upload_store.begin_finalize(upload_id)
+        if session is None:
+            return self._not_found(upload_id)
+        if session.state == UploadState.FINALIZED:
+            return JSONResponse(
+                content={
+                    "message": "Upload already finalized.",
+                    "upload_id": upload_id,
+                    "job_id": session.job_id,
+                    "dir_search_path": session.save_dir.replace("/", "+"),
+                }
+            )
+        if session.state != UploadState.OPEN:
+            return JSONResponse(
+                content={
+                    "message": f"Upload is {session.state.value}.",
+                    "upload_id": upload_id,
+                },
+                status_code=409,
+            )
+
+        received = await upload_store.received(upload_id)
+        if missing_ranges(received, session.size):
+            await upload_store.finish(upload_id, UploadState.OPEN)
+            return JSONResponse(
+                content={
+                    "message": "Upload is incomplete.",
+                    **self._session_content(session, received),
+                },
+                status_code=409,
+            )
+
+        digest = await upload_store.hash_file(upload_id)
+        if session.sha256 and digest != session.sha256:
+            # no way to tell which chunk is bad, so the whole file is resent
+            await upload_store.finish(upload_id, UploadState.OPEN, clear_chunks=True)
+            return JSONResponse(
+                content={
+                    "message": "File checksum mismatch, upload the file again.",
+                    "upload_id": upload_id,
+                    "sha256": digest,
+                },
+                status_code=409,
+            )
+
+        meeting = session.meeting
+        department = Department(meeting["department"])
+        processor = MeetingProcessor(
+            language=meeting["language"],
+            meeting_subject=meeting["meeting_subject"],
+            knowledge_patterns=[
+                KnowledgePattern(p) for p in meeting["knowledge_patterns"]
+            ],
+            department=department,
+            save_dir=MeetingProcessor.meeting_dir(department, f"_{upload_id[:8]}"),
+            audio_sha256=digest,
+            audio_size=session.size,
+        )
+        audio_path = os.path.join(processor.save_dir, session.filename)
+        part_path = upload_store.path(upload_id)
+        try:
+            await asyncio.to_thread(shutil.move, part_path, audio_path)
+            processor.audio_file_path = audio_path
+            job_id = await processor.submit()
+        except Exception as e:
+            settings.LOGGER.error(f"Error finalizing upload {upload_id}: {str(e)}")
+            if await aiofiles.os.path.exists(audio_path):
+                await asyncio.to_thread(shutil.move, audio_path, part_path)
+            await upload_store.finish(upload_id, UploadState.OPEN)
+            return JSONResponse(
+                content={
+                    "message": "Failed to queue the upload.",
+                    "upload_id": upload_id,
+                },
+                status_code=500,
+            )
+
+        await upload_store.finish(
+            upload_id,
+            UploadState.FINALIZED,
+            job_id=job_id,
+            save_dir=processor.save_dir,
+            clear_chunks=True,
+        )
+        return JSONResponse(
+            content={
+                "message": "Audio file saved successfully. Building knowledge base...",
+                "upload_id": upload_id,
+                "dir_search_path": processor.save_dir.replace("/", "+"),
+                "job_id": job_id,
+            }
+        )
+
+    async def abort(self, upload_id: str):
+        session = await upload_store.get(upload_id)
+        if session is None:
+            return self._not_found(upload_id)
+        if session.state == UploadState.FINALIZING:
+            return JSONResponse(
+                content={"message": "Upload is finalizing.", "upload_id": upload_id},
+                status_code=409,
+            )
+        await upload_store.delete(upload_id)
+        return JSONResponse(
+            content={"message": "Upload removed.", "upload_id": upload_id}
+        )
+
+
+class FetchWisdomFile:
+    @staticmethod
+    def _etag(stat: os.stat_result, encoding: Optional[str] = None) -> str:
+        tag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+    @staticmethod
+    def _not_modified(headers: Headers, etag: str, stat: os.stat_result) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(stat.st_mtime) <= since
+        return False
+
+    @staticmethod
+    def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+        """
+        Parse a single ``bytes=start-end`` range into inclusive offsets. Returns
+        None when the header should be ignored (multiple ranges, other units)
+        and raises ValueError when the range cannot be satisfied.
+        """
+        unit, _, spec = range_header.partition("=")
+        if unit.strip() != "bytes" or "," in spec:
+            return None
+        start, _, end = spec.strip().partition("-")
+        if not start:
+            # suffix range: the last N bytes
+            length = int(end)
+            if length <= 0:
+                raise ValueError(range_header)
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            raise ValueError(range_header)
+        return start, end
+
+    @staticmethod
+    async def _iter_file(path: str, start: int, length: int) -> AsyncIterator[bytes]:
+        async with aiofiles.open(path, mode="rb") as f:
+            await f.seek(start)
+            while length > 0:
+                chunk = await f.read(min(settings.UPLOAD_CHUNK_SIZE, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+
+    async def _find_variant(
+        self, file_path: str, stat: os.stat_result, accept_encoding: str
+    ) -> Tuple[str, os.stat_result, Optional[str]]:
+        accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+        for encoding, suffix in available_encodings().items():
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = await aiofiles.os.stat(file_path + suffix)
+            except FileNotFoundError:
+                continue
+            # ignore a stale variant left behind by an older result file
+            if variant_stat.st_mtime >= stat.st_mtime:
+                return file_path + suffix, variant_stat, encoding
+        return file_path, stat, None
+
+    async def get(self, dir_search_path: str, headers: Optional[Headers] = None):
+        headers = headers or Headers()
+        _file_search_dir = dir_search_path.replace("+", "/")
 
         # search the file (combined_results) from in dir_search_path. Try for .md first, then .json
-        file_path = os.path.join(_file_search_dir, "combined_results.md")
-        if not os.path.exists(file_path):
-            file_path = os.path.join(_file_search_dir, "combined_results.json")
+        file_path, stat = None, None
+        for filename in ("combined_results.md", "combined_results.json"):
+            try:
+                file_path = os.path.join(_file_search_dir, filename)
+                stat = await aiofiles.os.stat(file_path)
+                break
+            except (FileNotFoundError, NotADirectoryError):
+                continue
 
-        if not os.path.exists(file_path):
+        if stat is None:
             return JSONResponse(
                 content={
                     "message": "File not found. Try again.",
@@ -174,19 +939,192 @@ class FetchWisdomFile:
                 status_code=404,
             )
 
+        await retention_sweeper.touch(_file_search_dir)
+
         # check media type based on file extension
         if file_path.endswith(".json"):
             media_type = "application/json"
-        elif file_path.endswith(".md"):
-            media_type = "text/markdown"
+        else:
+            media_type = "text/markdown; charset=utf-8"
+
+        response_headers = {
+            "Content-Filename": os.path.basename(file_path),
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "no-cache",
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Vary": "Accept-Encoding",
+        }
+
+        range_header = headers.get("range")
+        if_range = headers.get("if-range")
+        if range_header and if_range and if_range != self._etag(stat):
+            range_header = None
+
+        # precompressed variants are only served for whole-file requests
+        serve_path, serve_stat, encoding = file_path, stat, None
+        if not range_header:
+            serve_path, serve_stat, encoding = await self._find_variant(
+                file_path, stat, headers.get("accept-encoding", "")
+            )
+        etag = self._etag(stat, encoding)
+        response_headers["ETag"] = etag
+        if encoding:
+            response_headers["Content-Encoding"] = encoding
+
+        if self._not_modified(headers, etag, stat):
+            return Response(status_code=304, headers=response_headers)
+
+        size = serve_stat.st_size
+        start, end, status_code = 0, size - 1, 200
+        if range_header:
+            try:
+                byte_range = self._parse_range(range_header, size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={**response_headers, "Content-Range": f"bytes */{size}"},
+                )
+            if byte_range:
+                start, end = byte_range
+                status_code = 206
+                response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        response_headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            self._iter_file(serve_path, start, end - start + 1),
+            status_code=status_code,
+            media_type=media_type,
+            headers=response_headers,
+        )
+
+
+class MeetingSearch:
+    MAX_LIMIT = 100
+
+    @staticmethod
+    def _page(total: int, meetings: List[dict], limit: int, offset: int):
+        return JSONResponse(
+            content={
+                "total": total,
+                "limit": limit,
+                "offset": offset,
+                "meetings": meetings,
+            }
+        )
+
+    async def list(
+        self, department: Optional[Department], limit: int = 20, offset: int = 0
+    ):
+        limit = min(max(limit, 1), self.MAX_LIMIT)
+        offset = max(offset, 0)
+        total, meetings = await meeting_catalog.list(
+            department.value if department else None, limit, offset
+        )
+        return self._page(total, meetings, limit, offset)
+
+    async def search(
+        self,
+        query: str,
+        department: Optional[Department],
+        limit: int = 20,
+        offset: int = 0,
+    ):
+        limit = min(max(limit, 1), self.MAX_LIMIT)
+        offset = max(offset, 0)
+        total, meetings = await meeting_catalog.search(
+            query, department.value if department else None, limit, offset
+        )
+        return self._page(total, meetings, limit, offset)
 
-        filename = os.path.basename(file_path)
 
-        # open the file and stream the content
-        async with aiofiles.open(file_path, mode="r") as f:
-            file_content = await f.read()
+class TranscriptWords:
+    @staticmethod
+    def _query(
+        path: str, start_ms: int, end_ms: int, group: str, limit: int
+    ) -> List[dict]:
+        with WordStore(path) as store:
+            if group == "utterances":
+                return store.utterances_between(
+                    start_ms, end_ms, limit, settings.UTTERANCE_GAP_MS
+                )
+            return store.words_between(start_ms, end_ms, limit)
 
-        # asyncio.create_task(self._schedule_file_deletion(_file_search_dir))
+    async def get(
+        self,
+        dir_search_path: str,
+        start_ms: int,
+        end_ms: int,
+        group: Literal["words", "utterances"] = "words",
+        limit: int = 1000,
+    ):
+        path = os.path.join(dir_search_path.replace("+", "/"), WORDS_FILENAME)
+        if not await aiofiles.os.path.exists(path):
+            return JSONResponse(
+                content={"message": "Transcript words not found.", "file_path": None},
+                status_code=404,
+            )
+        if start_ms < 0 or end_ms <= start_ms:
+            return JSONResponse(
+                content={"message": "end_ms must be greater than start_ms >= 0."},
+                status_code=400,
+            )
+
+        limit = min(max(limit, 1), settings.WORDS_MAX_RESULTS)
+        items = await asyncio.to_thread(
+            self._query, path, start_ms, end_ms, group, limit
+        )
         return JSONResponse(
-            content=file_content, headers={"Content-Filename": filename}
+            content={"start_ms": start_ms, "end_ms": end_ms, group: items}
+        )
+
+
+class JobStatus:
+    @staticmethod
+    def _format_event(event: Optional[dict]) -> str:
+        if event is None:
+            return ": keep-alive\n\n"
+        return (
+            f"id: {event['id']}\n"
+            f"event: {event['type']}\n"
+            f"data: {json.dumps(event['data'])}\n\n"
+        )
+
+    async def get(self, job_id: str):
+        job = await job_queue.store.get(job_id)
+        if job is None:
+            return JSONResponse(
+                content={"message": "Job not found.", "job_id": job_id},
+                status_code=404,
+            )
+
+        return JSONResponse(
+            content={
+                **job.to_dict(),
+                "meeting_subject": job.payload["meeting_subject"],
+                "dir_search_path": job.payload["save_dir"].replace("/", "+"),
+                "patterns_done": sorted(job.checkpoint.get("patterns", {})),
+                "preprocess": job.checkpoint.get("preprocess"),
+            }
+        )
+
+    async def stream(self, job_id: str, last_event_id: int = 0):
+        """
+        Server-Sent Events: stage transitions, each pattern result as soon as it
+        is ready (and partial tokens if STREAM_PATTERN_TOKENS is on), ending
+        with the final job state. Reconnecting clients resume via Last-Event-ID.
+        """
+        if await job_queue.store.get(job_id) is None:
+            return JSONResponse(
+                content={"message": "Job not found.", "job_id": job_id},
+                status_code=404,
+            )
+
+        async def event_stream():
+            async for event in job_queue.events(job_id, last_event_id):
+                yield self._format_event(event)
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
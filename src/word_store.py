@@ -0,0 +1,180 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+MAGIC = b"WRD1"
+# magic, word count, speaker table bytes, text bytes
+HEADER = struct.Struct("<4sIII")
+NO_SPEAKER = 0xFFFF
+WORDS_FILENAME = "transcript.words"
+
+
+def _aligned(size: int) -> int:
+    return (size + 3) & ~3
+
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_word_store(path: str, words: List[dict]):
+    """
+    Write AssemblyAI word dicts as columns: start/end (ms, uint32), confidence
+    (float32), speaker index (uint16) into an interned speaker table, and one
+    UTF-8 text buffer with uint32 offsets. Every column is 4-byte aligned so
+    the file can be memory-mapped and read without parsing.
+    """
+    speakers: List[str] = []
+    speaker_ids = {}
+    speaker_column, text, offsets = [], bytearray(), [0]
+    for word in words:
+        speaker = word.get("speaker")
+        if speaker is None:
+            speaker_column.append(NO_SPEAKER)
+        else:
+            if speaker not in speaker_ids:
+                speaker_ids[speaker] = len(speakers)
+                speakers.append(str(speaker))
+            speaker_column.append(speaker_ids[speaker])
+        text += word["text"].encode()
+        offsets.append(len(text))
+
+    speaker_table = "\0".join(speakers).encode()
+    sections = [
+        _column("I", (w["start"] for w in words)),
+        _column("I", (w["end"] for w in words)),
+        _column("f", (w.get("confidence") or 0.0 for w in words)),
+        _column("H", speaker_column),
+        _column("I", offsets),
+        speaker_table,
+        bytes(text),
+    ]
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(words), len(speaker_table), len(text)))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * (_aligned(len(section)) - len(section)))
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class WordStore:
+    """
+    Read-only, memory-mapped view of a file written by ``write_word_store``.
+    Range queries binary search the start column, so only the pages holding
+    the requested words are read.
+    """
+
+    path: str
+    count: int = field(init=False)
+    speakers: List[str] = field(init=False)
+
+    def __post_init__(self):
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, self.count, speaker_bytes, text_bytes = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a word store")
+
+        offset = HEADER.size
+
+        def take(size: int, typecode: Optional[str] = None):
+            nonlocal offset
+            section = view[offset : offset + size]
+            offset += _aligned(size)
+            return section.cast(typecode) if typecode else section
+
+        count = self.count
+        self.starts = take(4 * count, "I")
+        self.ends = take(4 * count, "I")
+        self.confidences = take(4 * count, "f")
+        self.speaker_ids = take(2 * count, "H")
+        self.text_offsets = take(4 * (count + 1), "I")
+        table = bytes(take(speaker_bytes))
+        self.speakers = table.decode().split("\0") if table else []
+        self.text = take(text_bytes)
+
+    def close(self):
+        for column in (
+            self.starts,
+            self.ends,
+            self.confidences,
+            self.speaker_ids,
+            self.text_offsets,
+            self.text,
+        ):
+            column.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "WordStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def word(self, i: int) -> dict:
+        speaker_id = self.speaker_ids[i]
+        text = self.text[self.text_offsets[i] : self.text_offsets[i + 1]]
+        return {
+            "text": bytes(text).decode(),
+            "start": self.starts[i],
+            "end": self.ends[i],
+            "confidence": round(self.confidences[i], 4),
+            "speaker": None if speaker_id == NO_SPEAKER else self.speakers[speaker_id],
+        }
+
+    def range_indexes(self, start_ms: int, end_ms: int) -> range:
+        """
+        Indexes of the words overlapping [start_ms, end_ms).
+        """
+        lo = bisect_right(self.starts, start_ms)
+        if lo > 0 and self.ends[lo - 1] > start_ms:
+            lo -= 1
+        hi = bisect_left(self.starts, end_ms)
+        return range(lo, max(lo, hi))
+
+    def words_between(self, start_ms: int, end_ms: int, limit: int) -> List[dict]:
+        indexes = self.range_indexes(start_ms, end_ms)
+        return [self.word(i) for i in indexes[:limit]]
+
+    def utterances_between(
+        self, start_ms: int, end_ms: int, limit: int, max_gap_ms: int
+    ) -> List[dict]:
+        """
+        Consecutive words grouped into utterances, split on a speaker change
+        or a pause longer than ``max_gap_ms``.
+        """
+        utterances = []
+        for i in self.range_indexes(start_ms, end_ms):
+            word = self.word(i)
+            current = utterances[-1] if utterances else None
+            if (
+                current is None
+                or current["speaker"] != word["speaker"]
+                or word["start"] - current["end"] > max_gap_ms
+            ):
+                if len(utterances) == limit:
+                    break
+                utterances.append(
+                    {
+                        "speaker": word["speaker"],
+                        "start": word["start"],
+                        "end": word["end"],
+                        "text": word["text"],
+                    }
+                )
+            else:
+                current["end"] = word["end"]
+                current["text"] += " " + word["text"]
+        return utterances